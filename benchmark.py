@@ -0,0 +1,194 @@
+"""Headless benchmarks for generation, reveal and rendering at several grid sizes.
+
+Examples:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --sizes 50x35,200x140 --seeds 5 --baseline bench.json
+
+Every run uses fixed seeds, so two runs on the same machine measure the
+same dungeons. Results are median milliseconds per operation, written as
+JSON; with --baseline they are compared against an earlier results file
+and the exit status is 1 when anything got slower than --tolerance allows.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from dungeon import CellState, CellType, DungeonMap, np
+
+DEFAULT_SIZES = "50x35,200x140,500x500,1000x1000"
+ROOM_QUERIES = 1000  # is_room_valid calls timed per dungeon
+FLOOD_FILLS = 100  # flood_fill_reveal calls timed per dungeon
+FRAMES = 5  # Full Game.draw frames timed per dungeon
+
+
+def timed(function, *args):
+    """Run function(*args) and return the elapsed milliseconds"""
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_generation(dungeon):
+    """Stage timings recorded by generate_dungeon, in ms.
+
+    The corridor stage is connect_rooms, i.e. one _connect_room_network
+    call per room type.
+    """
+    stages = {
+        'generate_rooms': 'rooms',
+        '_connect_room_network': 'corridors',
+        'calculate_adjacent_counts': 'adjacent_counts',
+        'label_reveal_regions': 'reveal_regions',
+    }
+    return {name: dungeon.generation_times[stage] * 1000 for name, stage in stages.items()}
+
+
+def bench_room_queries(dungeon, rng):
+    """Mean ms per is_room_valid call over random rooms of every size"""
+    queries = [(rng.randrange(dungeon.width), rng.randrange(dungeon.height),
+                rng.randint(4, 12), rng.randint(4, 12), rng.choice(("monster", "treasure")))
+               for _ in range(ROOM_QUERIES)]
+
+    def run():
+        for query in queries:
+            dungeon.is_room_valid(*query)
+    return timed(run) / ROOM_QUERIES
+
+
+def owned_copy(dungeon):
+    """Copy of dungeon with its own play state, so timings leave out the copy on first write"""
+    played = dungeon.copy()
+    played.own_state()
+    return played
+
+
+def bench_flood_fill(dungeon, rng):
+    """Mean ms per flood_fill_reveal call from random hidden floor cells, each on a fresh copy"""
+    cell_states = dungeon.cell_states
+    floor = [index for index, cell_type in enumerate(dungeon.cell_types)
+             if cell_type == CellType.FLOOR and cell_states[index] == CellState.HIDDEN]
+    starts = [divmod(index, dungeon.width)[::-1] for index in rng.sample(floor, min(FLOOD_FILLS, len(floor)))]
+    if not starts:
+        return 0.0
+    return sum(timed(owned_copy(dungeon).flood_fill_reveal, x, y) for x, y in starts) / len(starts)
+
+
+def bench_frame(game, dungeon, palette=False):
+    """Median ms of a full Game.draw frame showing the dungeon with the tile or palette renderer"""
+    import main
+    game.dungeon_map = dungeon.copy()
+    game.dungeon_view = main.DungeonView(game.dungeon_map)
+    game.state = main.GAME_SCREEN
+    renderer = main.PALETTE_RENDERER
+    main.PALETTE_RENDERER = palette
+    times = []
+    for _ in range(FRAMES):
+        game.dungeon_view.needs_full_redraw = True
+        times.append(timed(game.draw))
+    main.PALETTE_RENDERER = renderer
+    return statistics.median(times)
+
+
+def bench_size(width, height, seeds, game=None):
+    """Median ms per operation over the seeds for one grid size"""
+    samples = {}
+    for seed in seeds:
+        rng = random.Random(seed)
+        dungeon = DungeonMap(width, height, seed=seed)
+        results = bench_generation(dungeon)
+        results['is_room_valid'] = bench_room_queries(dungeon, rng)
+        results['flood_fill_reveal'] = bench_flood_fill(dungeon, rng)
+        results['reveal_all'] = timed(owned_copy(dungeon).reveal_all)
+        if game is not None:
+            results['game_draw_full'] = bench_frame(game, dungeon)
+            results['game_draw_palette'] = bench_frame(game, dungeon, palette=True)
+        for name, milliseconds in results.items():
+            samples.setdefault(name, []).append(milliseconds)
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+def compare(results, baseline, tolerance):
+    """Print results next to the baseline and return the operations that regressed"""
+    regressions = []
+    print(f"{'size':<10} {'operation':<26} {'baseline':>10} {'now':>10} {'change':>8}")
+    for size, operations in results.items():
+        for name, milliseconds in operations.items():
+            before = baseline.get(size, {}).get(name)
+            if not before:
+                continue
+            change = milliseconds / before - 1
+            flag = ''
+            if change > tolerance:
+                flag = '  slower'
+                regressions.append((size, name))
+            print(f"{size:<10} {name:<26} {before:10.3f} {milliseconds:10.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def parse_sizes(text):
+    sizes = []
+    for size in text.split(','):
+        width, _, height = size.lower().partition('x')
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark D&D Sweeper generation, reveal and rendering.")
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes(DEFAULT_SIZES),
+                        help=f"comma-separated WIDTHxHEIGHT grid sizes (default {DEFAULT_SIZES})")
+    parser.add_argument('--seeds', type=int, default=3, help="dungeons per size, seeded 0..N-1 (default %(default)s)")
+    parser.add_argument('--no-draw', action='store_true', help="skip the rendering benchmark (no pygame needed)")
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--baseline', help="compare against an earlier results file")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="slowdown allowed before an operation counts as regressed (default %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    game = None
+    if not args.no_draw:
+        import pygame
+        import main as front_end
+        pygame.init()
+        game = front_end.Game(pygame.display.set_mode((front_end.WINDOW_WIDTH, front_end.WINDOW_HEIGHT)))
+
+    results = {}
+    for width, height in args.sizes:
+        size = f'{width}x{height}'
+        results[size] = bench_size(width, height, range(args.seeds), game)
+        print(f"{size}: " + ", ".join(f"{name} {ms:.3f} ms" for name, ms in results[size].items()))
+
+    if args.output:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np is not None,
+            'seeds': args.seeds,
+            'results': results,
+        }
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} operations slower than the baseline by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1293 @@
+"""Dungeon generation and game rules for D&D Sweeper.
+
+This module has no pygame dependency, so dungeons can be generated and
+played headless; main.py is the pygame front end drawing on top of it.
+"""
+import asyncio
+import copy
+import heapq
+import mmap
+import random
+import struct
+import sys
+import time
+import weakref
+from array import array
+from collections import OrderedDict, deque
+from enum import IntEnum
+from itertools import accumulate
+from operator import attrgetter
+
+from profiler import profiler
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the pure-Python paths are used without it
+    np = None
+
+# Default grid size
+GRID_WIDTH = 50  # Increased from 40
+GRID_HEIGHT = 35  # Increased from 30
+# Smallest grid the generator handles: each of its 4x3 room sectors must fit a 4x4 room
+MIN_GRID_WIDTH = 24
+MIN_GRID_HEIGHT = 19
+
+# Room types placed by the generator
+ROOM_TYPES = ("monster", "treasure")
+
+# Number of generated dungeons DungeonMap.cached() keeps around for restarts
+LAYOUT_CACHE_SIZE = 16
+
+# Longest stretch of generation work between pauses in generate_async()
+GENERATION_SLICE = 0.004  # Seconds
+
+class CellType(IntEnum):
+    WALL = 0
+    FLOOR = 1
+    DOOR = 2
+    MONSTER = 3
+    TREASURE = 4
+
+class CellState(IntEnum):
+    HIDDEN = 0
+    REVEALED = 1
+    FLAGGED = 2
+    ROOM_WALL = 3  # New state for visible room walls
+
+# translate() tables turning a byte array of cell codes into 0xFF/0x00 masks
+WALL_MASK = bytes(0xFF if code == CellType.WALL else 0 for code in range(256))
+FLOOR_MASK = bytes(0xFF if code == CellType.FLOOR else 0 for code in range(256))
+# Renders cell codes as ASCII digits
+CELL_DIGITS = bytes((ord('0') + code) & 0xFF for code in range(256))
+# Maps cell codes to 1 for cells that count towards adjacent_count
+OCCUPIED = bytes(1 if code in (CellType.MONSTER, CellType.TREASURE) else 0 for code in range(256))
+
+def select_bytes(mask, if_true, if_false):
+    """Per-byte choice between two equally long byte strings using a 0xFF/0x00 mask"""
+    m = int.from_bytes(mask, 'little')
+    chosen = (int.from_bytes(if_true, 'little') & m) | (int.from_bytes(if_false, 'little') & ~m)
+    return chosen.to_bytes(len(mask), 'little')
+
+def spanning_connections(centers):
+    """Prim's minimum spanning tree over room centers using Manhattan distance.
+
+    Returns (connected, unconnected) index pairs in the order they are
+    joined, starting from room 0. Ties go to the earliest connected room and
+    then the earliest unconnected one. Runs in O(n^2) by keeping, for every
+    unconnected room, its closest connected room so far.
+    """
+    if np is not None and len(centers) > 1:
+        return _spanning_connections_numpy(centers)
+
+    x0, y0 = centers[0]
+    # Unconnected room -> (distance, index) of the closest connected room
+    closest = {j: (abs(x - x0) + abs(y - y0), 0) for j, (x, y) in enumerate(centers) if j}
+    connections = []
+    while closest:
+        j = min(closest, key=lambda k: (closest[k], k))
+        connections.append((closest.pop(j)[1], j))
+        jx, jy = centers[j]
+        for k, best in closest.items():
+            x, y = centers[k]
+            candidate = (abs(x - jx) + abs(y - jy), j)
+            if candidate < best:
+                closest[k] = candidate
+    return connections
+
+def _spanning_connections_numpy(centers):
+    n = len(centers)
+    xs = np.array([x for x, _ in centers], dtype=np.int64)
+    ys = np.array([y for _, y in centers], dtype=np.int64)
+    order = np.arange(n, dtype=np.int64)
+    unreachable = np.iinfo(np.int64).max
+    best_distance = np.abs(xs - xs[0]) + np.abs(ys - ys[0])
+    best_room = np.zeros(n, dtype=np.int64)
+    connected = np.zeros(n, dtype=bool)
+    connected[0] = True
+    connections = []
+    for _ in range(n - 1):
+        # One sortable key per room encodes (distance, connected room, room)
+        keys = (best_distance * n + best_room) * n + order
+        keys[connected] = unreachable
+        j = int(keys.argmin())
+        connections.append((int(best_room[j]), j))
+        connected[j] = True
+        distance = np.abs(xs - xs[j]) + np.abs(ys - ys[j])
+        better = (distance < best_distance) | ((distance == best_distance) & (j < best_room))
+        best_distance = np.where(better, distance, best_distance)
+        best_room = np.where(better, j, best_room)
+    return connections
+
+# Packed save format: a header, one record per room, then one little-endian
+# 16-bit word per cell holding type (bits 0-2), state (bits 3-4),
+# adjacent_count (bits 5-8) and room visibility (bit 9)
+DUNGEON_MAGIC = b'DDSW'
+FORMAT_VERSION = 1
+DUNGEON_HEADER = struct.Struct('<4sHHHQI?')  # magic, version, width, height, seed, rooms, game_over
+MAX_SEED = 2 ** 64 - 1  # Seeds are saved as unsigned 64-bit integers
+ROOM_RECORD = struct.Struct('<HHHHB?')  # x, y, width, height, room type index, connected
+# Byte lookup tables splitting and merging the low and high byte of each cell word
+_LOW_TYPE = bytes(code & 0x07 for code in range(256))
+_LOW_STATE = bytes((code >> 3) & 0x03 for code in range(256))
+_LOW_COUNT = bytes(code >> 5 for code in range(256))
+_HIGH_COUNT = bytes((code & 0x01) << 3 for code in range(256))
+_HIGH_VISIBLE = bytes((code >> 1) & 0x01 for code in range(256))
+_STATE_LOW = bytes((code << 3) & 0xFF for code in range(256))
+_COUNT_LOW = bytes((code << 5) & 0xFF for code in range(256))
+_COUNT_HIGH = bytes((code >> 3) & 0x01 for code in range(256))
+_VISIBLE_HIGH = bytes((code << 1) & 0xFF for code in range(256))
+
+def _or_bytes(*fields):
+    """Bitwise OR of equally long byte strings whose bits never overlap"""
+    total = 0
+    for field in fields:
+        total |= int.from_bytes(field, 'little')
+    return total.to_bytes(len(fields[0]), 'little')
+
+def pack_cells(cell_types, cell_states, adjacent_counts, visible):
+    """Interleave the per-cell arrays into little-endian 16-bit cell words"""
+    packed = bytearray(2 * len(cell_types))
+    packed[0::2] = _or_bytes(cell_types, cell_states.translate(_STATE_LOW),
+                             adjacent_counts.translate(_COUNT_LOW))
+    packed[1::2] = _or_bytes(adjacent_counts.translate(_COUNT_HIGH), visible.translate(_VISIBLE_HIGH))
+    return bytes(packed)
+
+def unpack_cells(words):
+    """Split packed cell words back into (types, states, counts, visible) bytearrays"""
+    raw = bytes(words)
+    low, high = raw[0::2], raw[1::2]
+    return (bytearray(low.translate(_LOW_TYPE)), bytearray(low.translate(_LOW_STATE)),
+            bytearray(_or_bytes(low.translate(_LOW_COUNT), high.translate(_HIGH_COUNT))),
+            bytearray(high.translate(_HIGH_VISIBLE)))
+
+class Cell:
+    """View of a single grid cell backed by the DungeonMap arrays"""
+    __slots__ = ('dungeon', 'x', 'y', 'index')
+
+    def __init__(self, dungeon, x, y):
+        self.dungeon = dungeon
+        self.x = x
+        self.y = y
+        self.index = y * dungeon.width + x
+
+    @property
+    def cell_type(self):
+        return CellType(self.dungeon.cell_types[self.index])
+
+    @cell_type.setter
+    def cell_type(self, value):
+        self.dungeon.set_cell_type(self.x, self.y, value)
+
+    @property
+    def state(self):
+        return CellState(self.dungeon.cell_states[self.index])
+
+    @state.setter
+    def state(self, value):
+        self.dungeon.own_state()
+        self.dungeon.cell_states[self.index] = value
+
+    @property
+    def adjacent_count(self):
+        return self.dungeon.adjacent_counts[self.index]
+
+    @property
+    def in_visible_room(self):
+        return bool(self.dungeon.visible[self.index])
+
+class RoomOccupancy:
+    """Room labels for every cell, with summed-area tables per room type.
+
+    The tables are kept per TILE x TILE block, so adding a room only rebuilds
+    the blocks it touches while a rectangle query still reads a constant
+    number of entries.
+    """
+    TILE = 16
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.room_ids = array('i', [-1]) * (width * height)  # First room covering each cell
+        self.occupied = {room_type: bytearray(width * height) for room_type in ROOM_TYPES}
+        self.tables = {room_type: {} for room_type in ROOM_TYPES}  # (tile_x, tile_y) -> table
+
+    def add_room(self, room_id, x, y, width, height, room_type):
+        """Record a room's interior and refresh the tables of the tiles it covers"""
+        bitmap = self.occupied[room_type]
+        room_ids = self.room_ids
+        for cy in range(y, y + height):
+            start = cy * self.width + x
+            bitmap[start:start + width] = b'\x01' * width
+            for index in range(start, start + width):
+                if room_ids[index] == -1:
+                    room_ids[index] = room_id
+
+        tile = self.TILE
+        tables = self.tables[room_type]
+        for tile_y in range(y // tile, (y + height - 1) // tile + 1):
+            for tile_x in range(x // tile, (x + width - 1) // tile + 1):
+                tables[(tile_x, tile_y)] = self._build_table(bitmap, tile_x, tile_y)
+
+    def copy(self):
+        occupancy = RoomOccupancy.__new__(RoomOccupancy)
+        occupancy.width = self.width
+        occupancy.height = self.height
+        occupancy.room_ids = array('i', self.room_ids)
+        occupancy.occupied = {room_type: bytearray(bitmap) for room_type, bitmap in self.occupied.items()}
+        # Tables are replaced whole when a tile changes, never edited in place
+        occupancy.tables = {room_type: dict(tables) for room_type, tables in self.tables.items()}
+        return occupancy
+
+    def _build_table(self, bitmap, tile_x, tile_y):
+        tile = self.TILE
+        x0, y0 = tile_x * tile, tile_y * tile
+        columns = min(tile, self.width - x0)
+        rows = min(tile, self.height - y0)
+        table = [[0] * (columns + 1)]
+        for row in range(rows):
+            start = (y0 + row) * self.width + x0
+            prefix = accumulate(bitmap[start:start + columns], initial=0)
+            table.append([above + left for above, left in zip(table[-1], prefix)])
+        return table
+
+    def count(self, room_type, x0, y0, x1, y1):
+        """Number of cells in [x0, x1) x [y0, y1) inside rooms of the given type"""
+        tile = self.TILE
+        tables = self.tables[room_type]
+        total = 0
+        for tile_y in range(y0 // tile, (y1 - 1) // tile + 1):
+            for tile_x in range(x0 // tile, (x1 - 1) // tile + 1):
+                table = tables.get((tile_x, tile_y))
+                if table is None:
+                    continue
+                left = max(x0 - tile_x * tile, 0)
+                right = min(x1 - tile_x * tile, len(table[0]) - 1)
+                top = max(y0 - tile_y * tile, 0)
+                bottom = min(y1 - tile_y * tile, len(table) - 1)
+                total += (table[bottom][right] - table[top][right]
+                          - table[bottom][left] + table[top][left])
+        return total
+
+class CorridorRouter:
+    """A* paths for corridors over a cost grid per room type.
+
+    Corridors may cross any wall, but stepping onto an existing corridor,
+    next to a room of the other type or into one costs extra, so networks
+    stay apart unless there is no other way. The map border is only
+    entered at the end of a route (the portals of ChunkedDungeon). The
+    cost grids and the search buffers are built once and reused by every
+    route, and a search stamp replaces clearing the buffers.
+    """
+    STEP = 1
+    CORRIDOR_PENALTY = 2
+    MARGIN_PENALTY = 8  # Cells touching a room of the other type
+    ROOM_PENALTY = 40  # Cells inside a room of the other type
+    # Overestimating the remaining cost makes A* head for the goal instead
+    # of exploring every equally short staircase; routes stay within this
+    # factor of the cheapest
+    HEURISTIC_WEIGHT = 2
+
+    def __init__(self, dungeon):
+        self.dungeon = dungeon
+        size = dungeon.width * dungeon.height
+        self.costs = {}  # room type -> bytearray of step costs, 0 where blocked
+        self.distances = array('i', [0]) * size
+        self.parents = array('i', [0]) * size
+        self.stamps = array('I', [0]) * size  # Search that last reached each cell
+        self.search = 0
+
+    def cost_grid(self, room_type):
+        costs = self.costs.get(room_type)
+        if costs is not None:
+            return costs
+        dungeon = self.dungeon
+        width, height = dungeon.width, dungeon.height
+        costs = bytearray([self.STEP]) * (width * height)
+        others = [room for room in dungeon.rooms if room['type'] != room_type]
+        for penalty, margin in ((self.MARGIN_PENALTY, 1), (self.ROOM_PENALTY, 0)):
+            for room in others:
+                x0, x1 = max(0, room['x'] - margin), min(width, room['x'] + room['width'] + margin)
+                for y in range(max(0, room['y'] - margin), min(height, room['y'] + room['height'] + margin)):
+                    costs[y * width + x0:y * width + x1] = bytes([self.STEP + penalty]) * (x1 - x0)
+        costs[:width] = costs[-width:] = bytes(width)
+        costs[::width] = costs[width - 1::width] = bytes(height)
+        self.costs[room_type] = costs
+        return costs
+
+    def route(self, start, goal, room_type):
+        """Cheapest 4-connected path of flat indices from start to goal, both included.
+
+        start must not lie on the map border. Ties go to the deepest node
+        and then the lowest index, which makes unobstructed routes come out
+        as L shapes.
+        """
+        dungeon = self.dungeon
+        width = dungeon.width
+        costs = self.cost_grid(room_type)
+        cell_types = dungeon.cell_types
+        distances, parents, stamps = self.distances, self.parents, self.stamps
+        self.search += 1
+        search = self.search
+        goal_y, goal_x = divmod(goal, width)
+        start_y, start_x = divmod(start, width)
+        step = self.STEP * self.HEURISTIC_WEIGHT  # Heuristic change per move
+        door, corridor_penalty = CellType.DOOR, self.CORRIDOR_PENALTY
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        stamps[start] = search
+        distances[start] = 0
+        parents[start] = -1
+        heap = [(step * (abs(goal_x - start_x) + abs(goal_y - start_y)), 0, start)]
+        while heap:
+            estimate, negative_distance, index = heappop(heap)
+            if index == goal:
+                break
+            distance = -negative_distance
+            if distance != distances[index]:
+                continue  # Superseded by a cheaper path
+            y, x = divmod(index, width)
+            remaining = estimate - distance
+            # Only the goal may lie on the blocked border, so every cell
+            # expanded here has all four neighbours
+            for neighbor, toward_goal in ((index - width, goal_y < y), (index - 1, goal_x < x),
+                                          (index + 1, goal_x > x), (index + width, goal_y > y)):
+                cost = costs[neighbor] or (self.STEP if neighbor == goal else 0)
+                if not cost:
+                    continue
+                if cell_types[neighbor] == door:
+                    cost += corridor_penalty
+                new_distance = distance + cost
+                if stamps[neighbor] == search and distances[neighbor] <= new_distance:
+                    continue
+                stamps[neighbor] = search
+                distances[neighbor] = new_distance
+                parents[neighbor] = index
+                heappush(heap, (new_distance + remaining + (-step if toward_goal else step),
+                                -new_distance, neighbor))
+        else:
+            return []
+
+        path = [goal]
+        while path[-1] != start:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
+
+class DungeonLayout:
+    """Everything generation decides about a dungeon.
+
+    A generated layout is only read while playing, so any number of games
+    (DungeonMaps) can share one. Editing a dungeon gives it a private copy
+    first.
+    """
+    def __init__(self, width, height, seed):
+        self.width = width
+        self.height = height
+        self.seed = seed
+        # Every random choice comes from this generator, so a seed fully
+        # determines the dungeon
+        self.rng = random.Random(seed)
+        # Cell data lives in parallel flat arrays indexed by y * width + x
+        size = width * height
+        self.cell_types = bytearray(size)  # CellType.WALL
+        self.adjacent_counts = bytearray(size)
+        # Zero-count floor regions revealed together by flood_fill_reveal
+        self.region_ids = array('i', [-1]) * size
+        self.reveal_regions = []
+        self.rooms = []
+        self.occupancy = RoomOccupancy(width, height)
+        # Seconds spent in each generate_dungeon stage
+        self.generation_times = {}
+
+    def copy(self):
+        layout = copy.copy(self)
+        layout.rng = random.Random()
+        layout.rng.setstate(self.rng.getstate())
+        layout.cell_types = bytearray(self.cell_types)
+        layout.adjacent_counts = bytearray(self.adjacent_counts)
+        layout.region_ids = array('i', self.region_ids)
+        layout.reveal_regions = list(self.reveal_regions)  # Regions are replaced, never edited
+        layout.rooms = [dict(room) for room in self.rooms]
+        layout.occupancy = self.occupancy.copy()
+        layout.generation_times = dict(self.generation_times)
+        return layout
+
+def _layout_attribute(name):
+    """DungeonMap property reading and writing an attribute of its DungeonLayout"""
+    return property(attrgetter('layout.' + name),
+                    lambda dungeon, value: setattr(dungeon.layout, name, value))
+
+class DungeonMap:
+    """One game on a dungeon: a shared DungeonLayout plus this game's play state"""
+    rng = _layout_attribute('rng')
+    cell_types = _layout_attribute('cell_types')
+    adjacent_counts = _layout_attribute('adjacent_counts')
+    region_ids = _layout_attribute('region_ids')
+    reveal_regions = _layout_attribute('reveal_regions')
+    rooms = _layout_attribute('rooms')
+    occupancy = _layout_attribute('occupancy')
+    generation_times = _layout_attribute('generation_times')
+
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None, generate=True):
+        self.width = width
+        self.height = height
+        if seed is None:
+            seed = random_seed()
+        self.seed = seed
+        self.layout = DungeonLayout(width, height, seed)
+        # False while the layout is shared with a copy
+        self.owns_layout = True
+        # Play state, one byte per cell in each array. It is shared with the
+        # dungeon this one was copied from until either of them changes it,
+        # so code writing to these arrays calls own_state() first
+        size = width * height
+        self.cell_states = bytearray(size)  # CellState.HIDDEN
+        self.visible = bytearray(size)  # 1 if the cell is in a visible room
+        self.owns_state = True
+        self.game_over = False
+        # Cells changed since the front end last drew them
+        self.dirty_cells = set()
+        # Cells whose type was edited since the front end last rebuilt its layout caches
+        self.layout_changes = []
+        self.needs_full_redraw = True
+        # Optional replay.SessionRecorder notified of every click
+        self.recorder = None
+        if generate:
+            self.generate_dungeon()
+            self.reveal_all_walls()  # Reveal walls before showing initial room
+            self.reveal_initial_room()
+
+    @classmethod
+    def cached(cls, seed, width=GRID_WIDTH, height=GRID_HEIGHT):
+        """Fresh dungeon for a seed, reusing a recently generated layout when possible"""
+        key = (seed, width, height)
+        layout = _layout_cache.get(key)
+        if layout is None:
+            layout = cls(width, height, seed=seed)
+            _remember_layout(key, layout)
+        else:
+            _layout_cache.move_to_end(key)
+        return layout.copy()
+
+    @classmethod
+    async def cached_async(cls, seed, width=GRID_WIDTH, height=GRID_HEIGHT, slice_seconds=GENERATION_SLICE):
+        """cached() that generates a missing layout with generate_async()"""
+        key = (seed, width, height)
+        layout = _layout_cache.get(key)
+        if layout is None:
+            layout = cls(width, height, seed=seed, generate=False)
+            await layout.generate_async(slice_seconds)
+            _remember_layout(key, layout)
+        else:
+            _layout_cache.move_to_end(key)
+        return layout.copy()
+
+    async def generate_async(self, slice_seconds=GENERATION_SLICE):
+        """Do what DungeonMap(..., generate=True) does without holding the event loop.
+
+        Generation pauses with asyncio.sleep(0) whenever it has been running
+        for slice_seconds, so on a single thread (like the browser build)
+        frames and input keep being served while a dungeon is built.
+        """
+        deadline = time.perf_counter() + slice_seconds
+        for _ in self.generation_steps():
+            if time.perf_counter() >= deadline:
+                await asyncio.sleep(0)
+                deadline = time.perf_counter() + slice_seconds
+        await asyncio.sleep(0)
+        self.reveal_all_walls()
+        self.reveal_initial_room()
+
+    def copy(self):
+        """New game continuing from this one's layout and play state.
+
+        Both share the layout and the play state arrays; whichever of the
+        two first changes them copies them (own_state(), _own_layout()), so
+        a game that is never played or edited costs almost no memory.
+        """
+        self.owns_layout = self.owns_state = False
+        dungeon = copy.copy(self)
+        dungeon.dirty_cells = set()
+        dungeon.layout_changes = []
+        dungeon.needs_full_redraw = True
+        dungeon.recorder = None
+        return dungeon
+
+    def own_state(self):
+        """Stop sharing the play state with copies; call before writing cell_states or visible"""
+        if not self.owns_state:
+            self.cell_states = bytearray(self.cell_states)
+            self.visible = bytearray(self.visible)
+            self.owns_state = True
+
+    def cell(self, x, y):
+        return Cell(self, x, y)
+
+    def to_bytes(self):
+        """Serialize the dungeon, including play state, to the packed save format"""
+        if not 0 <= self.seed <= MAX_SEED:
+            raise ValueError(f"seed {self.seed} cannot be saved; seeds must be between 0 and {MAX_SEED}")
+        header = DUNGEON_HEADER.pack(DUNGEON_MAGIC, FORMAT_VERSION, self.width, self.height,
+                                     self.seed, len(self.rooms), self.game_over)
+        rooms = b''.join(ROOM_RECORD.pack(room['x'], room['y'], room['width'], room['height'],
+                                          ROOM_TYPES.index(room['type']), room['connected'])
+                         for room in self.rooms)
+        return header + rooms + pack_cells(self.cell_types, self.cell_states,
+                                           self.adjacent_counts, self.visible)
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        """Rebuild a dungeon from data written by to_bytes()"""
+        return PackedDungeon(buffer).to_dungeon()
+
+    def save(self, path):
+        with open(path, 'wb') as save_file:
+            save_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as save_file:
+            with mmap.mmap(save_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with PackedDungeon(mapped) as packed:
+                    return packed.to_dungeon()
+
+    def to_dict(self):
+        """JSON-friendly description of the generated layout"""
+        return {
+            'seed': self.seed,
+            'width': self.width,
+            'height': self.height,
+            'rooms': [dict(room) for room in self.rooms],
+            # One digit per cell holding its CellType value, one string per row
+            'cells': [self.cell_types[row * self.width:(row + 1) * self.width]
+                      .translate(CELL_DIGITS).decode('ascii') for row in range(self.height)],
+        }
+
+    def reveal_all_walls(self):
+        """Reveal all walls in the dungeon from the start"""
+        self.own_state()
+        size = len(self.cell_states)
+        self.cell_states[:] = select_bytes(self.cell_types.translate(WALL_MASK),
+                                           bytes([CellState.REVEALED]) * size,
+                                           self.cell_states)
+        self.needs_full_redraw = True
+
+    def reveal_initial_room(self):
+        """Reveal a random treasure room at the start of the game"""
+        treasure_rooms = [room for room in self.rooms if room['type'] == "treasure"]
+        if treasure_rooms:
+            start_room = self.rng.choice(treasure_rooms)
+            self.mark_room_visible(start_room)
+
+    def mark_room_visible(self, room):
+        """Mark all cells in a room as visible"""
+        x0 = max(0, room['x'] - 1)
+        x1 = min(self.width, room['x'] + room['width'] + 1)
+        y0 = max(0, room['y'] - 1)
+        y1 = min(self.height, room['y'] + room['height'] + 1)
+        span = x1 - x0
+        self.own_state()
+        # Mark all cells in the room as visible, one row slice at a time
+        for y in range(y0, y1):
+            start = y * self.width + x0
+            end = start + span
+            self.visible[start:end] = b'\x01' * span
+            self.cell_states[start:end] = select_bytes(self.cell_types[start:end].translate(WALL_MASK),
+                                                       bytes([CellState.ROOM_WALL]) * span,
+                                                       self.cell_states[start:end])
+            self.dirty_cells.update(range(start, end))
+
+    def click(self, grid_x, grid_y):
+        """Apply a player's click on a grid cell"""
+        if self.recorder is not None:
+            self.recorder.record("click", grid_x, grid_y)
+        if self.game_over:
+            return
+
+        if 0 <= grid_y < self.height and 0 <= grid_x < self.width:
+            index = grid_y * self.width + grid_x
+            if self.cell_states[index] in (CellState.HIDDEN, CellState.ROOM_WALL):
+                # Check if clicked on a monster
+                if self.cell_types[index] == CellType.MONSTER:
+                    self.own_state()
+                    self.cell_states[index] = CellState.REVEALED
+                    self.dirty_cells.add(index)
+                    self.game_over = True
+                    self.reveal_all()
+                else:
+                    # Start flood fill from clicked cell
+                    with profiler.span("flood_fill_reveal", "reveal"):
+                        self.flood_fill_reveal(grid_x, grid_y)
+                    # Find and mark the room as visible
+                    room = self.room_at(grid_x, grid_y)
+                    if room is not None:
+                        self.mark_room_visible(room)
+
+    def room_at(self, x, y):
+        """Return the first room whose interior contains the given coordinates"""
+        room_id = self.occupancy.room_ids[y * self.width + x]
+        return self.rooms[room_id] if room_id != -1 else None
+
+    def reveal_room(self, room):
+        """Reveal all cells in a room"""
+        self.own_state()
+        for y in range(room['y'], room['y'] + room['height']):
+            for x in range(room['x'], room['x'] + room['width']):
+                if 0 <= y < self.height and 0 <= x < self.width:
+                    index = y * self.width + x
+                    self.cell_states[index] = CellState.REVEALED
+                    self.dirty_cells.add(index)
+                    # If it's a floor cell, check for connected areas
+                    if self.cell_types[index] == CellType.FLOOR:
+                        self.flood_fill_reveal(x, y)
+
+    def reveal_room_walls(self, x, y):
+        """Reveal walls around the room containing the given coordinates"""
+        # Find which room contains these coordinates
+        room = self.room_at(x, y)
+        if room is None:
+            return
+        # Show walls of this room and one tile beyond to ensure complete visibility
+        for cy in range(room['y'] - 2, room['y'] + room['height'] + 2):
+            for cx in range(room['x'] - 2, room['x'] + room['width'] + 2):
+                if 0 <= cy < self.height and 0 <= cx < self.width:
+                    index = cy * self.width + cx
+                    if (self.cell_types[index] == CellType.WALL and
+                            self.cell_states[index] == CellState.HIDDEN):
+                        self.own_state()
+                        self.cell_states[index] = CellState.ROOM_WALL
+                        self.dirty_cells.add(index)
+
+    def reveal_all(self):
+        """Reveal all cells when game is over"""
+        self.own_state()
+        self.cell_states[:] = bytes([CellState.REVEALED]) * len(self.cell_states)
+        self.needs_full_redraw = True
+
+    def is_room_valid(self, x, y, width, height, room_type):
+        """Check if a room can be placed at the given position"""
+        # Ensure room is at least 1 cell away from map borders
+        if x < 2 or y < 2 or x + width > self.width - 2 or y + height > self.height - 2:
+            return False
+
+        # Rooms may overlap or touch only rooms of their own type
+        return all(self.occupancy.count(other_type, x - 1, y - 1, x + width + 1, y + height + 1) == 0
+                   for other_type in ROOM_TYPES if other_type != room_type)
+
+    def generate_dungeon(self):
+        for _ in self.generation_steps():
+            pass
+
+    def generation_steps(self):
+        """Generate the dungeon in small steps, yielding the current stage name between them.
+
+        Driving the generator to the end builds exactly what generate_dungeon()
+        does; the pauses only give a caller the chance to do other work.
+        """
+        if self.width < MIN_GRID_WIDTH or self.height < MIN_GRID_HEIGHT:
+            raise ValueError(f"cannot generate a {self.width}x{self.height} dungeon; "
+                             f"the smallest is {MIN_GRID_WIDTH}x{MIN_GRID_HEIGHT}")
+        # Never regenerate a layout other games share
+        self._own_layout()
+        # Start with all walls
+        self.cell_types[:] = bytes(len(self.cell_types))
+        self.rooms = []
+        self.occupancy = RoomOccupancy(self.width, self.height)
+
+        # Generate random rooms, connect them with corridors, calculate adjacent
+        # counts for floor cells and precompute what clicking empty floor reveals
+        stages = [
+            ("rooms", self.room_steps()),
+            ("corridors", self.corridor_steps()),
+            ("adjacent_counts", _single_step(self.calculate_adjacent_counts)),
+            ("reveal_regions", self.reveal_region_steps()),
+        ]
+        for name, steps in stages:
+            self.generation_times[name] = 0.0
+            while True:
+                start = time.perf_counter()
+                with profiler.span(name, "generation"):
+                    finished = next(steps, _FINISHED) is _FINISHED
+                self.generation_times[name] += time.perf_counter() - start
+                if finished:
+                    break
+                yield name
+
+    def generate_rooms(self):
+        for _ in self.room_steps():
+            pass
+
+    def room_steps(self):
+        """Place the rooms, pausing every few placement attempts"""
+        attempts = 0
+        max_attempts = 1000
+        min_rooms = 40
+        max_rooms = 60
+        num_rooms = self.rng.randint(min_rooms, max_rooms)
+        
+        # Calculate room type distribution (2:1 ratio of monster:treasure)
+        num_treasure = num_rooms // 3
+        num_monster = num_rooms - num_treasure
+        
+        # Create room type list with 2:1 ratio
+        room_types = (["monster"] * num_monster + ["treasure"] * num_treasure)
+        self.rng.shuffle(room_types)
+        
+        # Ensure at least 3 treasure rooms and 6 monster rooms at the start
+        start_rooms = ["treasure", "treasure", "treasure"] + ["monster"] * 6
+        room_types = start_rooms + room_types[9:]
+        self.rng.shuffle(room_types)
+        
+        # Divide map into sectors for room placement
+        sectors = [(x, y) for x in range(4) for y in range(3)]
+        self.rng.shuffle(sectors)
+        sector_width = (self.width - 4) // 4
+        sector_height = (self.height - 4) // 3
+        
+        sector_index = 0
+        consecutive_failures = 0
+        max_consecutive_failures = 5  # Number of failures before reducing room size
+        current_max_size = 12  # Start with maximum room size
+        
+        while len(self.rooms) < num_rooms and attempts < max_attempts:
+            if attempts % 16 == 0:
+                yield
+            # Get current sector
+            if sector_index >= len(sectors):
+                self.rng.shuffle(sectors)
+                sector_index = 0
+            sector_x, sector_y = sectors[sector_index]
+            
+            # Calculate room position within sector
+            base_x = 2 + sector_x * sector_width
+            base_y = 2 + sector_y * sector_height
+            
+            # Adjust maximum room size based on consecutive failures
+            if consecutive_failures >= max_consecutive_failures:
+                current_max_size = max(4, current_max_size - 1)  # Reduce size but not below 4
+                consecutive_failures = 0  # Reset counter
+            
+            # Random room size (4 to current_max_size)
+            width = self.rng.randint(4, min(current_max_size, sector_width - 1))
+            height = self.rng.randint(4, min(current_max_size, sector_height - 1))
+            
+            # Random position within sector (with padding for merging)
+            x = self.rng.randint(base_x - 2, base_x + sector_width - width + 2)
+            y = self.rng.randint(base_y - 2, base_y + sector_height - height + 2)
+            
+            # Get room type from our prepared list
+            room_type = room_types[len(self.rooms)]
+            
+            if self.is_room_valid(x, y, width, height, room_type):
+                # Create room
+                self.create_room(x, y, width, height, room_type)
+                self.occupancy.add_room(len(self.rooms), x, y, width, height, room_type)
+                self.rooms.append({
+                    'x': x,
+                    'y': y,
+                    'width': width,
+                    'height': height,
+                    'type': room_type,
+                    'connected': False,
+                    'doors': []
+                })
+                sector_index += 1
+                consecutive_failures = 0  # Reset on success
+                current_max_size = min(12, current_max_size + 1)  # Try to increase size again
+            else:
+                consecutive_failures += 1
+            
+            attempts += 1
+
+    def create_room(self, x, y, width, height, room_type):
+        # The grid starts as solid wall, so the room's surrounding walls are already in place
+        grid_width = self.width
+        cell_types = self.cell_types
+
+        # Calculate content placement with reduced density
+        room_area = width * height
+        # Significantly reduced content density
+        min_content = max(1, room_area // 25)  # Was 15
+        max_content = max(2, room_area // 20)  # Was 10
+        num_content = self.rng.randint(min_content, max_content)
+        
+        # Get all possible floor positions
+        floor_positions = []
+        for cy in range(y, y + height):
+            for cx in range(x, x + width):
+                current_type = cell_types[cy * grid_width + cx]
+                if current_type != CellType.MONSTER and current_type != CellType.TREASURE:
+                    floor_positions.append((cx, cy))
+        
+        # Place content in random positions
+        for _ in range(num_content):
+            if floor_positions:
+                cx, cy = self.rng.choice(floor_positions)
+                floor_positions.remove((cx, cy))
+                cell_types[cy * grid_width + cx] = (CellType.MONSTER if room_type == "monster" 
+                                                    else CellType.TREASURE)
+        
+        # Fill remaining positions with floor
+        for cx, cy in floor_positions:
+            if cell_types[cy * grid_width + cx] == CellType.WALL:  # Only convert walls to floor
+                cell_types[cy * grid_width + cx] = CellType.FLOOR
+
+    def connect_rooms(self):
+        for _ in self.corridor_steps():
+            pass
+
+    def corridor_steps(self):
+        """Connect rooms of the same type with corridors, pausing after every corridor"""
+        if not self.rooms:
+            return
+
+        # Separate rooms by type
+        monster_rooms = [room for room in self.rooms if room['type'] == "monster"]
+        treasure_rooms = [room for room in self.rooms if room['type'] == "treasure"]
+        router = CorridorRouter(self)
+        yield
+
+        # Connect monster rooms
+        if monster_rooms:
+            yield from self._connect_room_network(monster_rooms, "monster", router)
+
+        # Connect treasure rooms
+        if treasure_rooms:
+            yield from self._connect_room_network(treasure_rooms, "treasure", router)
+
+    def _connect_room_network(self, rooms, room_type, router=None):
+        """Connect all rooms of the same type together, yielding after each corridor"""
+        if not rooms:
+            return
+
+        centers = [(room['x'] + room['width'] // 2, room['y'] + room['height'] // 2)
+                   for room in rooms]
+
+        # Start with the first room as connected
+        rooms[0]['connected'] = True
+
+        # Repeatedly join the closest pair of connected and unconnected rooms
+        router = router or CorridorRouter(self)
+        router.cost_grid(room_type)
+        yield
+        for i, j in spanning_connections(centers):
+            x1, y1 = centers[i]
+            x2, y2 = centers[j]
+            self.create_corridor(x1, y1, x2, y2, room_type, router)
+            rooms[j]['connected'] = True
+            yield
+
+    def create_corridor(self, x1, y1, x2, y2, room_type, router=None):
+        """Dig a corridor of doors along the cheapest route between two points for room_type"""
+        router = router or CorridorRouter(self)
+        cell_types = self.cell_types
+        for index in router.route(y1 * self.width + x1, y2 * self.width + x2, room_type):
+            # Rooms and earlier corridors keep their cells; only walls become doors
+            if cell_types[index] == CellType.WALL:
+                cell_types[index] = CellType.DOOR
+
+    def calculate_adjacent_counts(self):
+        """Count monsters/treasures around every floor cell with a 3x3 kernel sum"""
+        if np is not None:
+            self.adjacent_counts[:] = self._adjacent_counts_numpy()
+        else:
+            self.adjacent_counts[:] = self._adjacent_counts_python()
+
+    def _adjacent_counts_numpy(self):
+        cell_types = np.frombuffer(self.cell_types, dtype=np.uint8).reshape(self.height, self.width)
+        occupied = ((cell_types == CellType.MONSTER) | (cell_types == CellType.TREASURE)).astype(np.uint8)
+        padded = np.pad(occupied, 1)
+        counts = sum(padded[dy:dy + self.height, dx:dx + self.width]
+                     for dy in range(3) for dx in range(3)) - occupied
+        counts[cell_types != CellType.FLOOR] = 0
+        return counts.tobytes()
+
+    def _adjacent_counts_python(self):
+        # Every count fits in a byte, so the whole grid can be summed as one big
+        # integer. Rows get a zero byte of padding so shifts don't wrap into
+        # the neighbouring row.
+        width, height = self.width, self.height
+        stride = width + 1
+        occupied = self.cell_types.translate(OCCUPIED)
+        padded = b'\x00'.join(occupied[row * width:(row + 1) * width] for row in range(height)) + b'\x00'
+        cells = int.from_bytes(padded, 'little')
+        rows = cells + (cells << 8) + (cells >> 8)
+        totals = rows + (rows << stride * 8) + (rows >> stride * 8) - cells
+        counts = bytearray(totals.to_bytes(len(padded) + stride + 1, 'little')[:len(padded)])
+        del counts[width::stride]
+        floor = int.from_bytes(self.cell_types.translate(FLOOR_MASK), 'little')
+        return (int.from_bytes(counts, 'little') & floor).to_bytes(len(counts), 'little')
+
+    def label_reveal_regions(self):
+        """Group zero-count floor cells into 8-connected regions.
+
+        Each region stores its own cells followed by the numbered floor cells
+        bordering it, which is exactly what a flood fill from any of its
+        cells would reveal.
+        """
+        for _ in self.reveal_region_steps():
+            pass
+
+    def reveal_region_steps(self):
+        """label_reveal_regions(), pausing at the start of every grid row"""
+        width = self.width
+        cell_types = self.cell_types
+        adjacent_counts = self.adjacent_counts
+        region_ids = self.region_ids = array('i', [-1]) * len(cell_types)
+        self.reveal_regions = []
+
+        for start in range(len(cell_types)):
+            if start % width == 0:
+                yield
+            if (region_ids[start] != -1 or cell_types[start] != CellType.FLOOR or
+                    adjacent_counts[start] != 0):
+                continue
+            self.reveal_regions.append(self._label_region(start, len(self.reveal_regions)))
+
+    def _label_region(self, start, region_id):
+        """Label the unlabelled zero-count region around start; returns its cells then its border"""
+        width, height = self.width, self.height
+        cell_types = self.cell_types
+        adjacent_counts = self.adjacent_counts
+        region_ids = self.region_ids
+        region_ids[start] = region_id
+        cells = [start]
+        border = []
+        seen_border = set()
+        queue = deque([start])
+        while queue:
+            index = queue.popleft()
+            y, x = divmod(index, width)
+            for ny in range(max(0, y - 1), min(height, y + 2)):
+                for nx in range(max(0, x - 1), min(width, x + 2)):
+                    neighbor = ny * width + nx
+                    if cell_types[neighbor] != CellType.FLOOR or neighbor == index:
+                        continue
+                    if adjacent_counts[neighbor] == 0:
+                        if region_ids[neighbor] == -1:
+                            region_ids[neighbor] = region_id
+                            cells.append(neighbor)
+                            queue.append(neighbor)
+                    elif neighbor not in seen_border:
+                        seen_border.add(neighbor)
+                        border.append(neighbor)
+        return cells + border
+
+    def flood_fill_reveal(self, x, y):
+        """Reveal connected floor cells within the current room until hitting numbered cells or walls"""
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            return
+        
+        index = y * self.width + x
+        cell_type = self.cell_types[index]
+        if (self.cell_states[index] == CellState.REVEALED or
+                cell_type == CellType.WALL or cell_type == CellType.DOOR):
+            return
+
+        self.own_state()
+        region_id = self.region_ids[index]
+        if region_id == -1:
+            # Numbered floor, monsters and treasures only reveal themselves
+            self.cell_states[index] = CellState.REVEALED
+            self.dirty_cells.add(index)
+            return
+
+        # Empty floor reveals its whole precomputed region and the numbers around it
+        cell_states = self.cell_states
+        for region_index in self.reveal_regions[region_id]:
+            if cell_states[region_index] != CellState.REVEALED:
+                cell_states[region_index] = CellState.REVEALED
+                self.dirty_cells.add(region_index)
+
+    def set_cell_type(self, x, y, cell_type):
+        """Change one cell's type; returns the flat indices whose type or count changed.
+
+        Adjacent counts and reveal regions are only updated around the
+        cell. Walls are always shown revealed and anything carved out of a
+        wall starts hidden; other changes keep the cell's state.
+        """
+        index = y * self.width + x
+        old_type = self.cell_types[index]
+        if old_type == cell_type:
+            return []
+        self._own_layout()
+        self.cell_types[index] = cell_type
+        return self._update_layout({index: old_type})
+
+    def remove_content(self, x, y):
+        """Turn a monster or treasure into floor; returns the changed indices like set_cell_type"""
+        if self.cell_types[y * self.width + x] not in (CellType.MONSTER, CellType.TREASURE):
+            return []
+        return self.set_cell_type(x, y, CellType.FLOOR)
+
+    def collect_treasure(self, x, y):
+        """Pick up a revealed treasure, leaving revealed floor; returns whether there was one"""
+        index = y * self.width + x
+        if (self.game_over or self.cell_types[index] != CellType.TREASURE or
+                self.cell_states[index] != CellState.REVEALED):
+            return False
+        self.remove_content(x, y)
+        return True
+
+    def add_room(self, x, y, width, height, room_type):
+        """Place a room the way generation does if is_room_valid() allows it.
+
+        The room is not connected to the corridor network. Returns the
+        changed indices like set_cell_type, or None when the room does
+        not fit.
+        """
+        if not self.is_room_valid(x, y, width, height, room_type):
+            return None
+        self._own_layout()
+        old_types = {}
+        for cy in range(y, y + height):
+            start = cy * self.width + x
+            old_types.update(zip(range(start, start + width), self.cell_types[start:start + width]))
+        self.create_room(x, y, width, height, room_type)
+        self.occupancy.add_room(len(self.rooms), x, y, width, height, room_type)
+        self.rooms.append({
+            'x': x,
+            'y': y,
+            'width': width,
+            'height': height,
+            'type': room_type,
+            'connected': False,
+            'doors': []
+        })
+        cell_types = self.cell_types
+        return self._update_layout({index: old_type for index, old_type in old_types.items()
+                                    if cell_types[index] != old_type})
+
+    def _own_layout(self):
+        """Stop sharing the layout with copies before editing it"""
+        if not self.owns_layout:
+            self.layout = self.layout.copy()
+            self.owns_layout = True
+
+    def _update_layout(self, old_types):
+        """Refresh states, counts and reveal regions after the cells in old_types changed type"""
+        self._own_layout()
+        self.own_state()
+        width, height = self.width, self.height
+        cell_types = self.cell_types
+        cell_states = self.cell_states
+        adjacent_counts = self.adjacent_counts
+
+        def neighbourhood(index):
+            y, x = divmod(index, width)
+            return [ny * width + nx for ny in range(max(0, y - 1), min(height, y + 2))
+                    for nx in range(max(0, x - 1), min(width, x + 2))]
+
+        for index, old_type in old_types.items():
+            if cell_types[index] == CellType.WALL:
+                cell_states[index] = CellState.REVEALED
+            elif old_type == CellType.WALL:
+                cell_states[index] = CellState.HIDDEN
+
+        # Only cells next to a changed one can have a different count
+        touched = set(old_types)
+        for index in old_types:
+            touched.update(neighbourhood(index))
+        def reveal_role(cell_type, count):
+            """0 outside regions, 1 for region cells (empty floor), 2 for border cells (numbered floor)"""
+            return 0 if cell_type != CellType.FLOOR else 1 if count == 0 else 2
+
+        changed = set(old_types)
+        reclassified = []  # Cells whose reveal_role changed
+        for index in touched:
+            cell_type = cell_types[index]
+            old_count = adjacent_counts[index]
+            count = 0
+            if cell_type == CellType.FLOOR:
+                count = sum(OCCUPIED[cell_types[neighbor]] for neighbor in neighbourhood(index))
+            if count != old_count:
+                adjacent_counts[index] = count
+                changed.add(index)
+            if reveal_role(old_types.get(index, cell_type), old_count) != reveal_role(cell_type, count):
+                reclassified.append(index)
+
+        # Any region that now merges, splits or gains or loses border cells
+        # has a cell next to a reclassified one; relabel just those regions
+        region_ids = self.region_ids
+        stale = set()
+        seeds = set()
+        for index in reclassified:
+            for neighbor in neighbourhood(index):
+                seeds.add(neighbor)
+                if region_ids[neighbor] != -1:
+                    stale.add(region_ids[neighbor])
+        for region_id in stale:
+            for index in self.reveal_regions[region_id]:
+                if region_ids[index] == region_id:
+                    region_ids[index] = -1
+                    seeds.add(index)
+            self.reveal_regions[region_id] = None
+        free_ids = sorted(stale, reverse=True)
+        for start in sorted(seeds):
+            if region_ids[start] == -1 and cell_types[start] == CellType.FLOOR and adjacent_counts[start] == 0:
+                if free_ids:
+                    region_id = free_ids.pop()
+                    self.reveal_regions[region_id] = self._label_region(start, region_id)
+                else:
+                    self.reveal_regions.append(self._label_region(start, len(self.reveal_regions)))
+        # Drop the slots of regions that disappeared from the end of the list
+        while self.reveal_regions and self.reveal_regions[-1] is None:
+            self.reveal_regions.pop()
+
+        self.dirty_cells.update(changed)
+        self.layout_changes.extend(old_types)
+        return sorted(changed)
+
+def random_seed():
+    """Pick a seed for a new dungeon"""
+    return random.randrange(2 ** 32)
+
+def _single_step(function):
+    """Generator running a whole generation stage as one step"""
+    function()
+    yield
+
+_FINISHED = object()  # Returned by next() once a generation stage has run out of steps
+
+# (seed, width, height) -> untouched dungeon, only ever handed out as copies
+_layout_cache = OrderedDict()
+
+def _remember_layout(key, layout):
+    _layout_cache[key] = layout
+    if len(_layout_cache) > LAYOUT_CACHE_SIZE:
+        _layout_cache.popitem(last=False)
+
+class PackedDungeon:
+    """Read-only view of a dungeon in the packed save format.
+
+    Nothing is copied: cell words are read straight from the underlying
+    buffer, which can be bytes, a memoryview or an mmap of a save file.
+    """
+    def __init__(self, buffer):
+        self._view = view = memoryview(buffer).cast('B')
+        (magic, version, self.width, self.height, self.seed,
+         room_count, self.game_over) = DUNGEON_HEADER.unpack_from(view)
+        if magic != DUNGEON_MAGIC or version != FORMAT_VERSION:
+            raise ValueError("not a D&D Sweeper dungeon (version %d)" % FORMAT_VERSION)
+        self.rooms = []
+        offset = DUNGEON_HEADER.size
+        for _ in range(room_count):
+            x, y, width, height, room_type, connected = ROOM_RECORD.unpack_from(view, offset)
+            self.rooms.append({'x': x, 'y': y, 'width': width, 'height': height,
+                               'type': ROOM_TYPES[room_type], 'connected': connected, 'doors': []})
+            offset += ROOM_RECORD.size
+        self.size = offset + 2 * self.width * self.height
+        if len(view) < self.size:
+            raise ValueError("truncated dungeon data")
+        self.words = view[offset:self.size]
+        # Cell words are little-endian; a native 16-bit view is only valid on
+        # little-endian hosts (x86, ARM and WebAssembly all are)
+        self.cells = self.words.cast('H') if sys.byteorder == 'little' else None
+
+    def release(self):
+        """Drop the views into the buffer so an mmap behind it can be closed"""
+        if self.cells is not None:
+            self.cells.release()
+        self.words.release()
+        self._view.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def word(self, x, y):
+        index = y * self.width + x
+        if self.cells is not None:
+            return self.cells[index]
+        return self.words[2 * index] | self.words[2 * index + 1] << 8
+
+    def cell_type(self, x, y):
+        return CellType(self.word(x, y) & 0x07)
+
+    def state(self, x, y):
+        return CellState((self.word(x, y) >> 3) & 0x03)
+
+    def adjacent_count(self, x, y):
+        return (self.word(x, y) >> 5) & 0x0F
+
+    def in_visible_room(self, x, y):
+        return bool(self.word(x, y) >> 9 & 0x01)
+
+    def to_dungeon(self):
+        """Unpack into a playable DungeonMap"""
+        dungeon = DungeonMap(self.width, self.height, seed=self.seed, generate=False)
+        (dungeon.cell_types, dungeon.cell_states,
+         dungeon.adjacent_counts, dungeon.visible) = unpack_cells(self.words)
+        dungeon.game_over = self.game_over
+        for room_id, room in enumerate(self.rooms):
+            dungeon.occupancy.add_room(room_id, room['x'], room['y'], room['width'],
+                                       room['height'], room['type'])
+            dungeon.rooms.append(room)
+        dungeon.label_reveal_regions()
+        return dungeon
+
+class LevelPool:
+    """Many packed dungeons in one file, opened with mmap.
+
+    The file holds a header (MAGIC, level count, position of the offset
+    table), the dungeons back to back and finally a table of little-endian
+    byte offsets, one per dungeon.
+    """
+    MAGIC = b'DDSP'
+    HEADER = struct.Struct('<4sIQ')
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._handed_out = weakref.WeakSet()  # PackedDungeons still viewing the mmap
+        magic, self.count, self.table_offset = self.HEADER.unpack_from(self._view)
+        if magic != self.MAGIC:
+            raise ValueError("not a D&D Sweeper level pool")
+
+    @classmethod
+    def write(cls, path, packed_dungeons):
+        """Stream an iterable of to_bytes() results into a pool file"""
+        offsets = []
+        with open(path, 'wb') as pool_file:
+            pool_file.write(cls.HEADER.pack(cls.MAGIC, 0, 0))
+            offset = cls.HEADER.size
+            for packed in packed_dungeons:
+                offsets.append(offset)
+                pool_file.write(packed)
+                offset += len(packed)
+            pool_file.write(struct.pack('<%dQ' % len(offsets), *offsets))
+            pool_file.seek(0)
+            pool_file.write(cls.HEADER.pack(cls.MAGIC, len(offsets), offset))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        """Zero-copy PackedDungeon view of one level, usable until the pool is closed"""
+        if not 0 <= index < self.count:
+            raise IndexError("level index out of range")
+        (offset,) = struct.unpack_from('<Q', self._view, self.table_offset + 8 * index)
+        packed = PackedDungeon(self._view[offset:])
+        self._handed_out.add(packed)
+        return packed
+
+    def load(self, index):
+        with self[index] as packed:
+            return packed.to_dungeon()
+
+    def close(self):
+        # The mmap cannot be closed while any view into it is alive
+        for packed in list(self._handed_out):
+            packed.release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
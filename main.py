@@ -1,12 +1,21 @@
 import pygame
 import asyncio
+import functools
 import platform
 import hashlib
-import random
-from enum import Enum
-
-# Initialize Pygame
-pygame.init()
+import os
+import re
+import sys
+import time
+import weakref
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from dungeon import GRID_WIDTH, GRID_HEIGHT, WALL_MASK, CellType, CellState, DungeonMap, random_seed, select_bytes
+import solver
+from replay import SessionRecorder
+from profiler import profiler
+from world import ChunkedDungeon
 
 # Constants
 WINDOW_WIDTH = 1200
@@ -19,8 +28,6 @@ MODULE_SIZE = QR_SIZE // QR_MODULES
 
 # Game Grid Constants
 CELL_SIZE = 20  # Reduced from 25 to fit more cells
-GRID_WIDTH = 50  # Increased from 40
-GRID_HEIGHT = 35  # Increased from 30
 GRID_OFFSET_X = (WINDOW_WIDTH - GRID_WIDTH * CELL_SIZE) // 2
 GRID_OFFSET_Y = (WINDOW_HEIGHT - GRID_HEIGHT * CELL_SIZE) // 2
 
@@ -34,537 +41,619 @@ LIGHT_BROWN = (205, 133, 63)
 GOLD = (255, 215, 0)
 RED = (255, 0, 0)
 VERY_LIGHT_GRAY = (220, 220, 220)  # Made darker (was 240,240,240)
+HINT_BLUE = (0, 150, 255)
 
 # Game States
 WELCOME_SCREEN = "welcome"
 GAME_SCREEN = "game"
 
-class CellType(Enum):
-    WALL = "wall"
-    FLOOR = "floor"
-    DOOR = "door"
-    MONSTER = "monster"
-    TREASURE = "treasure"
-
-class CellState(Enum):
-    HIDDEN = "hidden"
-    REVEALED = "revealed"
-    FLAGGED = "flagged"
-    ROOM_WALL = "room_wall"  # New state for visible room walls
-
-class Cell:
-    def __init__(self, x, y, cell_type=CellType.WALL):
-        self.x = x
-        self.y = y
-        self.cell_type = cell_type
-        self.state = CellState.HIDDEN
-        self.adjacent_count = 0
-        self.in_visible_room = False  # Track if cell is in a visible room
-
-    def draw(self, surface):
-        rect = pygame.Rect(
-            GRID_OFFSET_X + self.x * CELL_SIZE,
-            GRID_OFFSET_Y + self.y * CELL_SIZE,
-            CELL_SIZE,
-            CELL_SIZE
-        )
-        
-        # Draw the cell based on its state
-        if self.state == CellState.HIDDEN:
-            if self.in_visible_room:
-                pygame.draw.rect(surface, GRAY, rect)  # Use gray for hidden cells in visible rooms
-                pygame.draw.rect(surface, DARK_GRAY, rect, 1)
-            else:
-                pygame.draw.rect(surface, BLACK, rect)  # Keep black for truly hidden cells
-        elif self.state == CellState.ROOM_WALL:
-            pygame.draw.rect(surface, DARK_GRAY, rect)
-        elif self.state == CellState.REVEALED:
-            if self.cell_type == CellType.WALL:
-                pygame.draw.rect(surface, DARK_GRAY, rect)
-            elif self.cell_type == CellType.FLOOR:
-                pygame.draw.rect(surface, VERY_LIGHT_GRAY, rect)
-                if self.adjacent_count > 0:
-                    font = pygame.font.Font(None, 24)
-                    text = font.render(str(self.adjacent_count), True, BLACK)
-                    text_rect = text.get_rect(center=rect.center)
-                    surface.blit(text, text_rect)
-            elif self.cell_type == CellType.DOOR:
-                pygame.draw.rect(surface, BROWN, rect)
-            elif self.cell_type == CellType.MONSTER:
-                pygame.draw.rect(surface, RED, rect)
-            elif self.cell_type == CellType.TREASURE:
-                pygame.draw.rect(surface, GOLD, rect)
-        
-        if self.state != CellState.HIDDEN or self.in_visible_room:  # Draw borders for visible room cells
-            pygame.draw.rect(surface, BLACK, rect, 1)
-
-class DungeonMap:
-    def __init__(self):
-        self.grid = [[Cell(x, y) for x in range(GRID_WIDTH)] for y in range(GRID_HEIGHT)]
-        self.rooms = []
-        self.game_over = False
-        self.generate_dungeon()
-        self.reveal_all_walls()  # Reveal walls before showing initial room
-        self.reveal_initial_room()
-
-    def reveal_all_walls(self):
-        """Reveal all walls in the dungeon from the start"""
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if self.grid[y][x].cell_type == CellType.WALL:
-                    self.grid[y][x].state = CellState.REVEALED
-
-    def reveal_initial_room(self):
-        """Reveal a random treasure room at the start of the game"""
-        treasure_rooms = [room for room in self.rooms if room['type'] == "treasure"]
-        if treasure_rooms:
-            start_room = random.choice(treasure_rooms)
-            self.mark_room_visible(start_room)
-
-    def mark_room_visible(self, room):
-        """Mark all cells in a room as visible"""
-        # Mark all cells in the room as visible
-        for y in range(room['y'] - 1, room['y'] + room['height'] + 1):
-            for x in range(room['x'] - 1, room['x'] + room['width'] + 1):
-                if 0 <= y < GRID_HEIGHT and 0 <= x < GRID_WIDTH:
-                    self.grid[y][x].in_visible_room = True
-                    if self.grid[y][x].cell_type == CellType.WALL:
-                        self.grid[y][x].state = CellState.ROOM_WALL
-
-    def handle_click(self, pos):
-        if self.game_over:
+# Frame pacing
+FPS = 60  # Frame cap while something is happening (0 = uncapped)
+IDLE_FPS = 15  # Input polling rate once nothing has happened for a while
+IDLE_AFTER = 1.0  # Seconds without input or redraws before dropping to IDLE_FPS
+
+# Profiling (F3 toggles the profiler and its HUD, F4 saves a Chrome trace)
+TRACE_FILE = "dd_sweeper_trace.json"
+
+# Full redraws: "palette" scales one 8-bit surface of cell colours, which
+# costs about the same at any zoom level, and "tiles" blits every cell, which
+# is cheaper on desktops but slow in the browser build
+DEFAULT_RENDERER = "palette" if sys.platform == "emscripten" else "tiles"
+PALETTE_RENDERER = os.environ.get('DDSWEEPER_RENDERER', DEFAULT_RENDERER) == "palette"
+
+# Session recording: DDSWEEPER_RECORD=<directory> saves every game for replay.py
+RECORD_DIR = os.environ.get('DDSWEEPER_RECORD')
+
+# Fill colour of revealed cells by type
+REVEALED_COLORS = {
+    CellType.WALL: DARK_GRAY,
+    CellType.FLOOR: VERY_LIGHT_GRAY,
+    CellType.DOOR: BROWN,
+    CellType.MONSTER: RED,
+    CellType.TREASURE: GOLD,
+}
+
+def cell_color(cell_type, state, in_visible_room):
+    """Colour filling a cell; tiles add the black border and the adjacent count on top"""
+    if state == CellState.HIDDEN:
+        return GRAY if in_visible_room else BLACK  # Gray for hidden cells in visible rooms
+    if state == CellState.ROOM_WALL:
+        return DARK_GRAY
+    if state == CellState.REVEALED:
+        return REVEALED_COLORS[cell_type]
+    return WHITE
+
+class TileAtlas:
+    """Pre-rendered cell tiles, one per (type, state, visibility, count) combination"""
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.font = pygame.font.Font(None, cell_size * 6 // 5)  # 24 at the default cell size
+        # Adjacent count -> (rendered digit, its offset inside a cell)
+        self.digits = {}
+        for adjacent_count in range(1, 9):
+            text = self.font.render(str(adjacent_count), True, BLACK)
+            self.digits[adjacent_count] = (text, text.get_rect(center=(cell_size // 2, cell_size // 2)).topleft)
+        rendered = {}
+        self.tiles = {}
+        for cell_type in CellType:
+            for state in CellState:
+                for in_visible_room in (False, True):
+                    for adjacent_count in range(9):
+                        # Many combinations look identical, so share their surfaces
+                        look = self._appearance(cell_type, state, in_visible_room, adjacent_count)
+                        if look not in rendered:
+                            rendered[look] = self._render_tile(cell_type, state, in_visible_room, adjacent_count)
+                        self.tiles[(cell_type, state, in_visible_room, adjacent_count)] = rendered[look]
+
+    @staticmethod
+    def _appearance(cell_type, state, in_visible_room, adjacent_count):
+        if state == CellState.HIDDEN:
+            return (state, in_visible_room)
+        if state == CellState.REVEALED:
+            if cell_type == CellType.FLOOR:
+                return (state, cell_type, adjacent_count)
+            return (state, cell_type)
+        return (state,)
+
+    def _render_tile(self, cell_type, state, in_visible_room, adjacent_count):
+        tile = pygame.Surface((self.cell_size, self.cell_size))
+        tile.fill(cell_color(cell_type, state, in_visible_room))
+        if state == CellState.REVEALED and cell_type == CellType.FLOOR and adjacent_count > 0:
+            tile.blit(*self.digits[adjacent_count])
+        if state != CellState.HIDDEN or in_visible_room:  # Draw borders for visible room cells
+            pygame.draw.rect(tile, BLACK, tile.get_rect(), 1)
+        return tile
+
+@functools.lru_cache(maxsize=None)
+def tile_atlas(cell_size):
+    """Shared TileAtlas for a cell size, so zooming back and forth never re-renders tiles"""
+    return TileAtlas(cell_size)
+
+def tile_key(dungeon, index):
+    """TileAtlas key of the cell at a flat index of a DungeonMap"""
+    return (dungeon.cell_types[index], dungeon.cell_states[index],
+            dungeon.visible[index], dungeon.adjacent_counts[index])
+
+class Camera:
+    """Pannable, zoomable window onto a grid of cells.
+
+    The viewport is the screen area the grid is drawn in; scroll_x/scroll_y
+    is the grid pixel (at the current zoom) shown at its top-left corner.
+    With bounds set, panning stops at the map edges and a map smaller than
+    the viewport is centred; without bounds the grid is unbounded.
+    """
+    ZOOM_LEVELS = (10, 15, 20, 30, 40)  # Cell sizes in pixels
+    PAN_STEP = 5  # Cells moved per key press
+    PAN_KEYS = {
+        pygame.K_LEFT: (-1, 0), pygame.K_a: (-1, 0),
+        pygame.K_RIGHT: (1, 0), pygame.K_d: (1, 0),
+        pygame.K_UP: (0, -1), pygame.K_w: (0, -1),
+        pygame.K_DOWN: (0, 1), pygame.K_s: (0, 1),
+    }
+    ZOOM_KEYS = {
+        pygame.K_PLUS: 1, pygame.K_EQUALS: 1, pygame.K_KP_PLUS: 1,
+        pygame.K_MINUS: -1, pygame.K_KP_MINUS: -1,
+    }
+
+    def __init__(self, viewport, cell_size=CELL_SIZE, bounds=None):
+        self.viewport = pygame.Rect(viewport)
+        self.cell_size = cell_size
+        self.bounds = bounds  # (width, height) in cells, or None
+        self.scroll_x = 0
+        self.scroll_y = 0
+        self.clamp()
+
+    def clamp(self):
+        if self.bounds is None:
             return
-
-        grid_x = (pos[0] - GRID_OFFSET_X) // CELL_SIZE
-        grid_y = (pos[1] - GRID_OFFSET_Y) // CELL_SIZE
-        
-        if 0 <= grid_y < GRID_HEIGHT and 0 <= grid_x < GRID_WIDTH:
-            cell = self.grid[grid_y][grid_x]
-            if cell.state in [CellState.HIDDEN, CellState.ROOM_WALL]:
-                # Check if clicked on a monster
-                if cell.cell_type == CellType.MONSTER:
-                    cell.state = CellState.REVEALED
-                    self.game_over = True
-                    self.reveal_all()
-                else:
-                    # Start flood fill from clicked cell
-                    self.flood_fill_reveal(grid_x, grid_y)
-                    # Find and mark the room as visible
-                    for room in self.rooms:
-                        if (room['x'] <= grid_x < room['x'] + room['width'] and 
-                            room['y'] <= grid_y < room['y'] + room['height']):
-                            self.mark_room_visible(room)
-                            break
-
-    def reveal_room(self, room):
-        """Reveal all cells in a room"""
-        for y in range(room['y'], room['y'] + room['height']):
-            for x in range(room['x'], room['x'] + room['width']):
-                if 0 <= y < GRID_HEIGHT and 0 <= x < GRID_WIDTH:
-                    cell = self.grid[y][x]
-                    cell.state = CellState.REVEALED
-                    # If it's a floor cell, check for connected areas
-                    if cell.cell_type == CellType.FLOOR:
-                        self.flood_fill_reveal(x, y)
-
-    def reveal_room_walls(self, x, y):
-        """Reveal walls around the room containing the given coordinates"""
-        # Find which room contains these coordinates
-        for room in self.rooms:
-            if (room['x'] <= x < room['x'] + room['width'] and 
-                room['y'] <= y < room['y'] + room['height']):
-                # Show walls of this room and one tile beyond to ensure complete visibility
-                for cy in range(room['y'] - 2, room['y'] + room['height'] + 2):
-                    for cx in range(room['x'] - 2, room['x'] + room['width'] + 2):
-                        if 0 <= cy < GRID_HEIGHT and 0 <= cx < GRID_WIDTH:
-                            cell = self.grid[cy][cx]
-                            if cell.cell_type == CellType.WALL:
-                                if cell.state == CellState.HIDDEN:
-                                    cell.state = CellState.ROOM_WALL
-                break
-
-    def reveal_all(self):
-        """Reveal all cells when game is over"""
-        for row in self.grid:
-            for cell in row:
-                cell.state = CellState.REVEALED
-
-    def is_room_valid(self, x, y, width, height, room_type):
-        """Check if a room can be placed at the given position"""
-        # Ensure room is at least 1 cell away from map borders
-        if x < 2 or y < 2 or x + width > GRID_WIDTH - 2 or y + height > GRID_HEIGHT - 2:
+        width, height = self.bounds
+        self.scroll_x = self._clamp_axis(self.scroll_x, width * self.cell_size, self.viewport.width)
+        self.scroll_y = self._clamp_axis(self.scroll_y, height * self.cell_size, self.viewport.height)
+
+    @staticmethod
+    def _clamp_axis(scroll, map_size, view_size):
+        if map_size <= view_size:
+            return -((view_size - map_size) // 2)
+        return min(max(scroll, 0), map_size - view_size)
+
+    def center_on(self, x, y):
+        """Scroll so that grid cell (x, y) sits in the middle of the viewport"""
+        self.scroll_x = x * self.cell_size + self.cell_size // 2 - self.viewport.width // 2
+        self.scroll_y = y * self.cell_size + self.cell_size // 2 - self.viewport.height // 2
+        self.clamp()
+
+    def center_cell(self):
+        return self.screen_to_cell(self.viewport.center)
+
+    def pan(self, dx, dy):
+        self.scroll_x += dx
+        self.scroll_y += dy
+        self.clamp()
+
+    def zoom(self, steps, anchor=None):
+        """Change the cell size by steps zoom levels, keeping the grid point under anchor still"""
+        levels = self.ZOOM_LEVELS
+        current = levels.index(self.cell_size) if self.cell_size in levels else levels.index(CELL_SIZE)
+        new_size = levels[min(max(current + steps, 0), len(levels) - 1)]
+        if new_size == self.cell_size:
             return False
-
-        # For overlapping rooms, only allow if they are of the same type
-        overlapping_room_found = False
-        overlapping_type = None
-        
-        for cy in range(y - 1, y + height + 1):
-            for cx in range(x - 1, x + width + 1):
-                if not (0 <= cy < GRID_HEIGHT and 0 <= cx < GRID_WIDTH):
-                    return False
-                # Check if this cell is already part of another room
-                if self.grid[cy][cx].cell_type != CellType.WALL:
-                    # Find the overlapping room
-                    for room in self.rooms:
-                        if (room['x'] <= cx <= room['x'] + room['width'] - 1 and 
-                            room['y'] <= cy <= room['y'] + room['height'] - 1):
-                            if not overlapping_room_found:
-                                overlapping_room_found = True
-                                overlapping_type = room['type']
-                            elif room['type'] != overlapping_type:
-                                # Found a second room of different type
-                                return False
-                            break
-                    
-                    # If we found an overlapping room of different type, reject
-                    if overlapping_room_found and overlapping_type != room_type:
-                        return False
-        
+        if anchor is None or not self.viewport.collidepoint(anchor):
+            anchor = self.viewport.center
+        offset_x = anchor[0] - self.viewport.x
+        offset_y = anchor[1] - self.viewport.y
+        self.scroll_x = (self.scroll_x + offset_x) * new_size // self.cell_size - offset_x
+        self.scroll_y = (self.scroll_y + offset_y) * new_size // self.cell_size - offset_y
+        self.cell_size = new_size
+        self.clamp()
         return True
 
-    def generate_dungeon(self):
-        # Start with all walls
-        for row in self.grid:
-            for cell in row:
-                cell.cell_type = CellType.WALL
+    def handle_key(self, event):
+        """Pan or zoom for a key press; returns True when the view moved"""
+        if event.key in self.PAN_KEYS:
+            dx, dy = self.PAN_KEYS[event.key]
+            step = self.PAN_STEP * self.cell_size
+            before = (self.scroll_x, self.scroll_y)
+            self.pan(dx * step, dy * step)
+            return (self.scroll_x, self.scroll_y) != before
+        if event.key in self.ZOOM_KEYS:
+            return self.zoom(self.ZOOM_KEYS[event.key])
+        return False
 
-        # Generate random rooms
-        self.generate_rooms()
-        
-        # Connect rooms with corridors
-        self.connect_rooms()
-        
-        # Calculate adjacent counts for floor cells
-        self.calculate_adjacent_counts()
-
-    def generate_rooms(self):
-        attempts = 0
-        max_attempts = 1000
-        min_rooms = 40
-        max_rooms = 60
-        num_rooms = random.randint(min_rooms, max_rooms)
-        
-        # Calculate room type distribution (2:1 ratio of monster:treasure)
-        num_treasure = num_rooms // 3
-        num_monster = num_rooms - num_treasure
-        
-        # Create room type list with 2:1 ratio
-        room_types = (["monster"] * num_monster + ["treasure"] * num_treasure)
-        random.shuffle(room_types)
-        
-        # Ensure at least 3 treasure rooms and 6 monster rooms at the start
-        start_rooms = ["treasure", "treasure", "treasure"] + ["monster"] * 6
-        room_types = start_rooms + room_types[9:]
-        random.shuffle(room_types)
-        
-        # Divide map into sectors for room placement
-        sectors = [(x, y) for x in range(4) for y in range(3)]
-        random.shuffle(sectors)
-        sector_width = (GRID_WIDTH - 4) // 4
-        sector_height = (GRID_HEIGHT - 4) // 3
-        
-        sector_index = 0
-        consecutive_failures = 0
-        max_consecutive_failures = 5  # Number of failures before reducing room size
-        current_max_size = 12  # Start with maximum room size
-        
-        while len(self.rooms) < num_rooms and attempts < max_attempts:
-            # Get current sector
-            if sector_index >= len(sectors):
-                random.shuffle(sectors)
-                sector_index = 0
-            sector_x, sector_y = sectors[sector_index]
-            
-            # Calculate room position within sector
-            base_x = 2 + sector_x * sector_width
-            base_y = 2 + sector_y * sector_height
-            
-            # Adjust maximum room size based on consecutive failures
-            if consecutive_failures >= max_consecutive_failures:
-                current_max_size = max(4, current_max_size - 1)  # Reduce size but not below 4
-                consecutive_failures = 0  # Reset counter
-            
-            # Random room size (4 to current_max_size)
-            width = random.randint(4, min(current_max_size, sector_width - 1))
-            height = random.randint(4, min(current_max_size, sector_height - 1))
-            
-            # Random position within sector (with padding for merging)
-            x = random.randint(base_x - 2, base_x + sector_width - width + 2)
-            y = random.randint(base_y - 2, base_y + sector_height - height + 2)
-            
-            # Get room type from our prepared list
-            room_type = room_types[len(self.rooms)]
-            
-            if self.is_room_valid(x, y, width, height, room_type):
-                # Create room
-                self.create_room(x, y, width, height, room_type)
-                self.rooms.append({
-                    'x': x,
-                    'y': y,
-                    'width': width,
-                    'height': height,
-                    'type': room_type,
-                    'connected': False,
-                    'doors': []
-                })
-                sector_index += 1
-                consecutive_failures = 0  # Reset on success
-                current_max_size = min(12, current_max_size + 1)  # Try to increase size again
+    def visible_range(self):
+        """Half-open (left, top, right, bottom) range of grid cells overlapping the viewport"""
+        size = self.cell_size
+        left = self.scroll_x // size
+        top = self.scroll_y // size
+        right = -(-(self.scroll_x + self.viewport.width) // size)
+        bottom = -(-(self.scroll_y + self.viewport.height) // size)
+        if self.bounds is not None:
+            width, height = self.bounds
+            left, top = max(left, 0), max(top, 0)
+            right, bottom = min(right, width), min(bottom, height)
+        return left, top, right, bottom
+
+    def cell_position(self, x, y):
+        """Top-left screen position of grid cell (x, y)"""
+        return (self.viewport.x + x * self.cell_size - self.scroll_x,
+                self.viewport.y + y * self.cell_size - self.scroll_y)
+
+    def screen_to_cell(self, pos):
+        """Grid cell under a screen position, or None outside the viewport"""
+        if not self.viewport.collidepoint(pos):
+            return None
+        return ((pos[0] - self.viewport.x + self.scroll_x) // self.cell_size,
+                (pos[1] - self.viewport.y + self.scroll_y) // self.cell_size)
+
+# Maps cell states to 1 for cells the player can see
+SHOWN = bytes(0 if code == CellState.HIDDEN else 1 for code in range(256))
+OPEN_RUN = re.compile(b'\x00+')
+
+class WallLayer:
+    """Pre-rendered walls of a DungeonMap.
+
+    Revealed walls look the same for the rest of the game, so they are
+    baked into surfaces of BLOCK x BLOCK cells, rendered lazily for each
+    zoom level, and a full redraw blits those instead of every wall tile.
+    """
+    BLOCK = 16  # Cells per block side
+    MAX_BLOCKS = 64  # Rendered blocks kept across zoom levels
+
+    def __init__(self, dungeon):
+        self.dungeon = dungeon
+        width = dungeon.width
+        size = len(dungeon.cell_types)
+        # 1 for revealed walls
+        self.static = bytearray(select_bytes(dungeon.cell_types.translate(WALL_MASK),
+                                             dungeon.cell_states.translate(SHOWN), bytes(size)))
+        # Per row, the columns that still have to be drawn cell by cell
+        self.open_columns = []
+        for start in range(0, size, width):
+            columns = []
+            for run in OPEN_RUN.finditer(self.static, start, start + width):
+                columns.extend(range(run.start() - start, run.end() - start))
+            self.open_columns.append(columns)
+        self.blocks = OrderedDict()  # (cell_size, block_x, block_y) -> Surface
+
+    def block(self, cell_size, block_x, block_y):
+        key = (cell_size, block_x, block_y)
+        surface = self.blocks.get(key)
+        if surface is not None:
+            self.blocks.move_to_end(key)
+            return surface
+
+        dungeon = self.dungeon
+        x0, y0 = block_x * self.BLOCK, block_y * self.BLOCK
+        x1, y1 = min(x0 + self.BLOCK, dungeon.width), min(y0 + self.BLOCK, dungeon.height)
+        surface = pygame.Surface(((x1 - x0) * cell_size, (y1 - y0) * cell_size)).convert()
+        surface.fill(WHITE)
+        tiles = tile_atlas(cell_size).tiles
+        surface.blits([(tiles[tile_key(dungeon, y * dungeon.width + x)], ((x - x0) * cell_size, (y - y0) * cell_size))
+                       for y in range(y0, y1) for x in range(x0, x1) if self.static[y * dungeon.width + x]],
+                      doreturn=False)
+        self.blocks[key] = surface
+        if len(self.blocks) > self.MAX_BLOCKS:
+            self.blocks.popitem(last=False)
+        return surface
+
+    def update(self, indices):
+        """Follow type edits of the given cells and drop the blocks showing them.
+
+        Returns the cells that just became static walls; until the next
+        full redraw rebuilds their blocks they are painted one by one.
+        """
+        dungeon = self.dungeon
+        width = dungeon.width
+        newly_static = set()
+        stale_blocks = set()
+        for index in set(indices):
+            static = dungeon.cell_types[index] == CellType.WALL and dungeon.cell_states[index] != CellState.HIDDEN
+            if static == self.static[index]:
+                continue
+            self.static[index] = static
+            y, x = divmod(index, width)
+            if static:
+                self.open_columns[y].remove(x)
+                newly_static.add(index)
             else:
-                consecutive_failures += 1
-            
-            attempts += 1
-
-    def create_room(self, x, y, width, height, room_type):
-        # Create room walls only where there isn't already a floor
-        for cy in range(y - 1, y + height + 1):
-            for cx in range(x - 1, x + width + 1):
-                if 0 <= cy < GRID_HEIGHT and 0 <= cx < GRID_WIDTH:
-                    # Only place wall if the cell isn't already a floor or special cell
-                    current_type = self.grid[cy][cx].cell_type
-                    if current_type == CellType.WALL:
-                        self.grid[cy][cx].cell_type = CellType.WALL
-
-        # Calculate content placement with reduced density
-        room_area = width * height
-        # Significantly reduced content density
-        min_content = max(1, room_area // 25)  # Was 15
-        max_content = max(2, room_area // 20)  # Was 10
-        num_content = random.randint(min_content, max_content)
-        
-        # Get all possible floor positions
-        floor_positions = []
-        for cy in range(y, y + height):
-            for cx in range(x, x + width):
-                current_type = self.grid[cy][cx].cell_type
-                if current_type not in [CellType.MONSTER, CellType.TREASURE]:
-                    floor_positions.append((cx, cy))
-        
-        # Place content in random positions
-        for _ in range(num_content):
-            if floor_positions:
-                cx, cy = random.choice(floor_positions)
-                floor_positions.remove((cx, cy))
-                self.grid[cy][cx].cell_type = (CellType.MONSTER if room_type == "monster" 
-                                             else CellType.TREASURE)
-        
-        # Fill remaining positions with floor
-        for cx, cy in floor_positions:
-            if self.grid[cy][cx].cell_type == CellType.WALL:  # Only convert walls to floor
-                self.grid[cy][cx].cell_type = CellType.FLOOR
+                insort(self.open_columns[y], x)
+            stale_blocks.add((x // self.BLOCK, y // self.BLOCK))
+        for key in [key for key in self.blocks if key[1:] in stale_blocks]:
+            del self.blocks[key]
+        return newly_static
+
+    def draw(self, surface, camera, origin_x, origin_y, left, top, right, bottom):
+        """Blit the blocks covering local cells [left, right) x [top, bottom)"""
+        size = self.BLOCK
+        surface.blits([(self.block(camera.cell_size, block_x, block_y),
+                        camera.cell_position(origin_x + block_x * size, origin_y + block_y * size))
+                       for block_y in range(top // size, (bottom - 1) // size + 1)
+                       for block_x in range(left // size, (right - 1) // size + 1)], doreturn=False)
+
+# Palette rendering of full redraws: one byte per cell in a small 8-bit
+# surface, built from the cell arrays without a Python loop per cell and
+# scaled up with a single blit; digits and grid lines are drawn over it
+PALETTE = sorted({cell_color(cell_type, state, in_visible_room) for cell_type in CellType
+                  for state in CellState for in_visible_room in (False, True)})
+
+def _palette_index_table():
+    """bytes.translate table from cell code type | state << 3 | visible << 5 to palette index"""
+    table = bytearray(256)
+    for cell_type in CellType:
+        for state in CellState:
+            for in_visible_room in (0, 1):
+                table[cell_type | state << 3 | in_visible_room << 5] = \
+                    PALETTE.index(cell_color(cell_type, state, in_visible_room))
+    return bytes(table)
+
+PALETTE_INDEX = _palette_index_table()
+STATE_BITS = bytes((code << 3) & 0xFF for code in range(256))
+VISIBLE_BITS = bytes((code << 5) & 0xFF for code in range(256))
+NUMBERED = bytes(0xFF if index == PALETTE.index(VERY_LIGHT_GRAY) else 0 for index in range(256))  # Revealed floor
+NONZERO = re.compile(b'[^\x00]')
+GRID_KEY = (255, 0, 255)  # Transparent colour of the grid line layer
+
+class PaletteCanvas:
+    """Surfaces reused by every palette redraw of a viewport at one cell size"""
+    def __init__(self, cell_size, viewport_size):
+        # Enough cells for any scroll position, including partly shown ones
+        columns = viewport_size[0] // cell_size + 2
+        rows = viewport_size[1] // cell_size + 2
+        size = (columns * cell_size, rows * cell_size)
+        self.scaled = pygame.Surface(size).convert()  # Receives the cell colours scaled up
+
+        # The black border of every cell; hidden cells without a border are black anyway
+        outline = pygame.Surface((cell_size, cell_size))
+        outline.fill(GRID_KEY)
+        pygame.draw.rect(outline, BLACK, outline.get_rect(), 1)
+        self.grid = pygame.Surface(size).convert()
+        self.grid.blits([(outline, (x * cell_size, y * cell_size)) for y in range(rows) for x in range(columns)],
+                        doreturn=False)
+        self.grid.set_colorkey(GRID_KEY, pygame.RLEACCEL)
+
+@functools.lru_cache(maxsize=len(Camera.ZOOM_LEVELS))
+def palette_canvas(cell_size, viewport_size):
+    return PaletteCanvas(cell_size, viewport_size)
+
+def draw_palette(surface, camera, dungeon, origin_x, origin_y, left, top, right, bottom):
+    """Full redraw of local cells [left, right) x [top, bottom), looking exactly like the tiles"""
+    width = dungeon.width
+    cell_size = camera.cell_size
+    columns, rows = right - left, bottom - top
+    start, end = top * width, bottom * width
+    codes = (int.from_bytes(dungeon.cell_types[start:end], 'little') |
+             int.from_bytes(dungeon.cell_states[start:end].translate(STATE_BITS), 'little') |
+             int.from_bytes(dungeon.visible[start:end].translate(VISIBLE_BITS), 'little'))
+    pixels = codes.to_bytes(end - start, 'little').translate(PALETTE_INDEX)
+    counts = bytes(dungeon.adjacent_counts[start:end])
+    if columns != width:
+        pixels = b''.join(pixels[row * width + left:row * width + right] for row in range(rows))
+        counts = b''.join(counts[row * width + left:row * width + right] for row in range(rows))
+
+    cells = pygame.image.frombuffer(pixels, (columns, rows), 'P')
+    cells.set_palette(PALETTE)
+    canvas = palette_canvas(cell_size, camera.viewport.size)
+    area = pygame.Rect(0, 0, columns * cell_size, rows * cell_size)
+    pygame.transform.scale(cells.convert(), area.size, canvas.scaled.subsurface(area))
+    x0, y0 = camera.cell_position(origin_x + left, origin_y + top)
+    surface.blit(canvas.scaled, (x0, y0), area)
+
+    # Adjacent counts of revealed floor cells, then the borders on top as in a tile
+    numbers = (int.from_bytes(counts, 'little') &
+               int.from_bytes(pixels.translate(NUMBERED), 'little')).to_bytes(len(counts), 'little')
+    digits = tile_atlas(cell_size).digits
+    blits = []
+    for match in NONZERO.finditer(numbers):
+        row, column = divmod(match.start(), columns)
+        digit, (offset_x, offset_y) = digits[numbers[match.start()]]
+        blits.append((digit, (x0 + column * cell_size + offset_x, y0 + row * cell_size + offset_y)))
+    surface.blits(blits, doreturn=False)
+    surface.blit(canvas.grid, (x0, y0), area)
+
+def draw_map(surface, camera, dungeon, walls, origin_x=0, origin_y=0, full_redraw=False):
+    """Draw the visible part of a DungeonMap whose top-left cell sits at grid (origin_x, origin_y).
+
+    A full redraw paints the wall layer and then every other visible cell;
+    otherwise only dirty cells are repainted. Returns the screen positions
+    of the cells drawn one by one.
+    """
+    relaid = walls.update(dungeon.layout_changes) if dungeon.layout_changes else ()
+    dungeon.layout_changes.clear()
+    view_left, view_top, view_right, view_bottom = camera.visible_range()
+    width = dungeon.width
+    left = max(0, view_left - origin_x)
+    right = min(width, view_right - origin_x)
+    top = max(0, view_top - origin_y)
+    bottom = min(dungeon.height, view_bottom - origin_y)
+    if left >= right or top >= bottom:
+        dungeon.dirty_cells.clear()
+        return []
+
+    if full_redraw and PALETTE_RENDERER:
+        draw_palette(surface, camera, dungeon, origin_x, origin_y, left, top, right, bottom)
+        dungeon.dirty_cells.clear()
+        return []
+    if full_redraw:
+        walls.draw(surface, camera, origin_x, origin_y, left, top, right, bottom)
+        indices = []
+        for y in range(top, bottom):
+            columns = walls.open_columns[y]
+            indices.extend(y * width + x for x in columns[bisect_left(columns, left):bisect_left(columns, right)])
+    else:
+        static = walls.static
+        indices = [index for index in dungeon.dirty_cells
+                   if (not static[index] or index in relaid) and left <= index % width < right and top <= index // width < bottom]
+    dungeon.dirty_cells.clear()
+
+    tiles = tile_atlas(camera.cell_size).tiles
+    positions = [camera.cell_position(origin_x + index % width, origin_y + index // width) for index in indices]
+    surface.blits([(tiles[tile_key(dungeon, index)], position)
+                   for index, position in zip(indices, positions)], doreturn=False)
+    return positions
+
+GRID_VIEWPORT = (GRID_OFFSET_X, GRID_OFFSET_Y, GRID_WIDTH * CELL_SIZE, GRID_HEIGHT * CELL_SIZE)
+
+class DungeonView:
+    """Draws the part of a DungeonMap under a camera and turns mouse positions into grid clicks"""
+    def __init__(self, dungeon_map):
+        self.dungeon_map = dungeon_map
+        self.camera = Camera(GRID_VIEWPORT, bounds=(dungeon_map.width, dungeon_map.height))
+        self.wall_layer = WallLayer(dungeon_map)
+        self.hint = None  # Flat index of the cell the solver suggested, outlined until the next click
+
+    @property
+    def needs_full_redraw(self):
+        return self.dungeon_map.needs_full_redraw
+
+    @needs_full_redraw.setter
+    def needs_full_redraw(self, value):
+        self.dungeon_map.needs_full_redraw = value
 
-    def connect_rooms(self):
-        if not self.rooms:
+    def handle_click(self, pos):
+        cell = self.camera.screen_to_cell(pos)
+        if cell is not None:
+            self.clear_hint()
+            self.dungeon_map.click(*cell)
+
+    def handle_key(self, event):
+        if event.key == pygame.K_h:
+            self.show_hint()
+        elif self.camera.handle_key(event):
+            self.needs_full_redraw = True
+
+    def handle_zoom(self, steps, anchor):
+        if self.camera.zoom(steps, anchor):
+            self.needs_full_redraw = True
+
+    def show_hint(self):
+        """Outline a cell the solver proves safe, scrolling it into view if needed"""
+        self.clear_hint()
+        cell = solver.hint(self.dungeon_map)
+        if cell is None:
             return
+        x, y = cell
+        self.hint = y * self.dungeon_map.width + x
+        self.dungeon_map.dirty_cells.add(self.hint)
+        left, top, right, bottom = self.camera.visible_range()
+        if not (left <= x < right and top <= y < bottom):
+            self.camera.center_on(x, y)
+            self.needs_full_redraw = True
+
+    def clear_hint(self):
+        if self.hint is not None:
+            self.dungeon_map.dirty_cells.add(self.hint)  # Repaint the cell without its outline
+            self.hint = None
 
-        # Separate rooms by type
-        monster_rooms = [room for room in self.rooms if room['type'] == "monster"]
-        treasure_rooms = [room for room in self.rooms if room['type'] == "treasure"]
-
-        # Connect monster rooms
-        if monster_rooms:
-            self._connect_room_network(monster_rooms, "monster")
-
-        # Connect treasure rooms
-        if treasure_rooms:
-            self._connect_room_network(treasure_rooms, "treasure")
-
-    def _connect_room_network(self, rooms, room_type):
-        """Connect all rooms of the same type together"""
-        if not rooms:
-            return
+    def draw(self, surface):
+        """Repaint changed cells in the viewport and return the screen rects that were touched"""
+        camera = self.camera
+        dungeon = self.dungeon_map
+        full_redraw = dungeon.needs_full_redraw
+        hint_repainted = self.hint is not None and (full_redraw or self.hint in dungeon.dirty_cells)
+        # Cells straddling the viewport edge must not spill over the rest of the screen
+        surface.set_clip(camera.viewport)
+        positions = draw_map(surface, camera, dungeon, self.wall_layer, full_redraw=full_redraw)
+        if hint_repainted:
+            y, x = divmod(self.hint, dungeon.width)
+            pygame.draw.rect(surface, HINT_BLUE, (camera.cell_position(x, y), (camera.cell_size, camera.cell_size)), 3)
+        surface.set_clip(None)
+
+        if full_redraw:
+            dungeon.needs_full_redraw = False
+            return [camera.viewport.copy()]
+        cell_size = camera.cell_size
+        return [pygame.Rect(position, (cell_size, cell_size)).clip(camera.viewport) for position in positions]
+
+class WorldView:
+    """Draws the part of a ChunkedDungeon under a camera"""
+    def __init__(self, world):
+        self.world = world
+        self.camera = Camera(GRID_VIEWPORT)
+        self.camera.center_on(world.chunk_width // 2, world.chunk_height // 2)
+        self.wall_layers = weakref.WeakKeyDictionary()  # Live chunk -> WallLayer, dropped on eviction
+        self.needs_full_redraw = True
+
+    @property
+    def dungeon_map(self):
+        return self.world
 
-        # Start with the first room as connected
-        rooms[0]['connected'] = True
-        
-        # Keep connecting until all rooms are connected
-        while not all(room['connected'] for room in rooms):
-            # Find the closest pair of connected and unconnected rooms
-            best_distance = float('inf')
-            best_connection = None
-            
-            for room1 in rooms:
-                if not room1['connected']:
-                    continue
-                    
-                for room2 in rooms:
-                    if room2['connected']:
-                        continue
-                        
-                    # Calculate center points
-                    c1x = room1['x'] + room1['width'] // 2
-                    c1y = room1['y'] + room1['height'] // 2
-                    c2x = room2['x'] + room2['width'] // 2
-                    c2y = room2['y'] + room2['height'] // 2
-                    
-                    dist = abs(c1x - c2x) + abs(c1y - c2y)
-                    if dist < best_distance:
-                        best_distance = dist
-                        best_connection = (room1, room2, c1x, c1y, c2x, c2y)
-            
-            if best_connection:
-                room1, room2, x1, y1, x2, y2 = best_connection
-                self.create_corridor(x1, y1, x2, y2, room_type)
-                room2['connected'] = True
-
-    def create_corridor(self, x1, y1, x2, y2, room_type):
-        """Create a corridor between two points"""
-        # First go horizontally, then vertically
-        current_x = x1
-        current_y = y1
-        
-        # All corridors are doors (brown color)
-        corridor_type = CellType.DOOR
-        
-        # Place corridor at start
-        if self.grid[y1][x1].cell_type == CellType.WALL:
-            self.grid[y1][x1].cell_type = corridor_type
-        
-        # Horizontal movement
-        while current_x != x2:
-            step = 1 if x2 > current_x else -1
-            current_x += step
-            if self.grid[current_y][current_x].cell_type == CellType.WALL:
-                self.grid[current_y][current_x].cell_type = corridor_type
-        
-        # Vertical movement
-        while current_y != y2:
-            step = 1 if y2 > current_y else -1
-            current_y += step
-            if self.grid[current_y][current_x].cell_type == CellType.WALL:
-                self.grid[current_y][current_x].cell_type = corridor_type
-
-    def calculate_adjacent_counts(self):
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if self.grid[y][x].cell_type == CellType.FLOOR:
-                    count = 0
-                    # Check all 8 adjacent cells
-                    for dy in [-1, 0, 1]:
-                        for dx in [-1, 0, 1]:
-                            if dx == 0 and dy == 0:
-                                continue
-                            new_x, new_y = x + dx, y + dy
-                            if 0 <= new_y < GRID_HEIGHT and 0 <= new_x < GRID_WIDTH:
-                                cell_type = self.grid[new_y][new_x].cell_type
-                                if cell_type in [CellType.MONSTER, CellType.TREASURE]:
-                                    count += 1
-                    self.grid[y][x].adjacent_count = count
+    def handle_click(self, pos):
+        cell = self.camera.screen_to_cell(pos)
+        if cell is not None:
+            self.world.click(*cell)
+
+    def moved(self):
+        # Generate what is coming into view and drop what fell far behind
+        self.world.set_focus(*self.camera.center_cell())
+        self.needs_full_redraw = True
+
+    def handle_key(self, event):
+        if self.camera.handle_key(event):
+            self.moved()
+
+    def handle_zoom(self, steps, anchor):
+        if self.camera.zoom(steps, anchor):
+            self.moved()
+
+    def visible_chunks(self):
+        """Yield (chunk, chunk origin x, chunk origin y) for loaded chunks overlapping the viewport"""
+        world = self.world
+        left, top, right, bottom = self.camera.visible_range()
+        first_x, first_y, _, _ = world.chunk_of(left, top)
+        last_x, last_y, _, _ = world.chunk_of(right - 1, bottom - 1)
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                chunk = world.chunks.get((chunk_x, chunk_y))
+                if chunk is not None:
+                    yield chunk, chunk_x * world.chunk_width, chunk_y * world.chunk_height
 
     def draw(self, surface):
-        for row in self.grid:
-            for cell in row:
-                cell.draw(surface)
+        """Repaint changed cells in the viewport and return the screen rects that were touched"""
+        camera = self.camera
+        chunks = list(self.visible_chunks())
+        full_redraw = self.needs_full_redraw or any(chunk.needs_full_redraw for chunk, _, _ in chunks)
+
+        positions = []
+        surface.set_clip(camera.viewport)
+        for chunk, origin_x, origin_y in chunks:
+            walls = self.wall_layers.get(chunk)
+            if walls is None:
+                walls = self.wall_layers[chunk] = WallLayer(chunk)
+            positions += draw_map(surface, camera, chunk, walls, origin_x, origin_y, full_redraw)
+            chunk.needs_full_redraw = False
+        surface.set_clip(None)
+
+        if full_redraw:
+            self.needs_full_redraw = False
+            return [camera.viewport.copy()]
+        cell_size = camera.cell_size
+        return [pygame.Rect(position, (cell_size, cell_size)).clip(camera.viewport) for position in positions]
+
+@functools.lru_cache(maxsize=8)
+def qr_modules(url):
+    """QR-like module grid derived from a URL hash, one byte per module (1 = black)"""
+    # Create a hash of the URL to generate a unique pattern
+    hash_bytes = hashlib.sha256(url.encode()).digest()
+    modules = bytearray(QR_MODULES * QR_MODULES)
 
-    def flood_fill_reveal(self, x, y):
-        """Reveal connected floor cells within the current room until hitting numbered cells or walls"""
-        if not (0 <= y < GRID_HEIGHT and 0 <= x < GRID_WIDTH):
-            return
-        
-        cell = self.grid[y][x]
-        if cell.state == CellState.REVEALED or cell.cell_type == CellType.WALL or cell.cell_type == CellType.DOOR:
-            return
-            
-        # Reveal the current cell
-        cell.state = CellState.REVEALED
-        
-        # If it's a floor cell with no adjacent monsters/treasures, continue flood fill within the room
-        if cell.cell_type == CellType.FLOOR and cell.adjacent_count == 0:
-            for dy in [-1, 0, 1]:
-                for dx in [-1, 0, 1]:
-                    if dx == 0 and dy == 0:
-                        continue
-                    
-                    new_x, new_y = x + dx, y + dy
-                    if not (0 <= new_y < GRID_HEIGHT and 0 <= new_x < GRID_WIDTH):
-                        continue
-                        
-                    next_cell = self.grid[new_y][new_x]
-                    # Continue flood fill if:
-                    # 1. Cell is not a wall or door
-                    # 2. Cell is not already revealed
-                    # 3. Cell is a floor
-                    if (next_cell.cell_type == CellType.FLOOR and 
-                        next_cell.state != CellState.REVEALED):
-                        self.flood_fill_reveal(new_x, new_y)
-        # If it's a floor cell with adjacent monsters/treasures, reveal it but don't continue flood fill
-        elif cell.cell_type == CellType.FLOOR and cell.adjacent_count > 0:
-            cell.state = CellState.REVEALED
-
-# Create the window
-screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-pygame.display.set_caption("D&D Sweeper")
+    def fill(col, row, size, value):
+        for y in range(row, row + size):
+            modules[y * QR_MODULES + col:y * QR_MODULES + col + size] = bytes([value]) * size
 
-def draw_qr_pattern(surface, x, y, url):
-    """Draw a simple QR-like pattern based on URL hash"""
-    # Create a hash of the URL to generate a unique pattern
-    hash_obj = hashlib.sha256(url.encode())
-    hash_bytes = hash_obj.digest()
-    
-    # Draw white background
-    pygame.draw.rect(surface, WHITE, (x, y, QR_SIZE, QR_SIZE))
-    
-    # Draw black border
-    border_size = MODULE_SIZE * 2
-    pygame.draw.rect(surface, BLACK, (x, y, QR_SIZE, QR_SIZE), border_size)
-    
-    # Draw position detection patterns (corners)
+    # Black border, two modules wide
+    fill(0, 0, QR_MODULES, 1)
+    fill(2, 2, QR_MODULES - 4, 0)
+
+    # Position detection patterns (corners)
     for corner_x, corner_y in [(0, 0), (0, QR_MODULES-7), (QR_MODULES-7, 0)]:
-        # Outer square
-        pygame.draw.rect(surface, BLACK, 
-                        (x + corner_x * MODULE_SIZE, 
-                         y + corner_y * MODULE_SIZE, 
-                         7 * MODULE_SIZE, 
-                         7 * MODULE_SIZE))
-        # Inner white square
-        pygame.draw.rect(surface, WHITE, 
-                        (x + (corner_x + 1) * MODULE_SIZE, 
-                         y + (corner_y + 1) * MODULE_SIZE, 
-                         5 * MODULE_SIZE, 
-                         5 * MODULE_SIZE))
-        # Center black square
-        pygame.draw.rect(surface, BLACK, 
-                        (x + (corner_x + 2) * MODULE_SIZE, 
-                         y + (corner_y + 2) * MODULE_SIZE, 
-                         3 * MODULE_SIZE, 
-                         3 * MODULE_SIZE))
-    
+        fill(corner_x, corner_y, 7, 1)  # Outer square
+        fill(corner_x + 1, corner_y + 1, 5, 0)  # Inner white square
+        fill(corner_x + 2, corner_y + 2, 3, 1)  # Center black square
+
     # Use hash to generate pattern
-    for i in range(len(hash_bytes)):
-        byte = hash_bytes[i]
+    for i, byte in enumerate(hash_bytes):
         row = (i * 8) // QR_MODULES
         col = (i * 8) % QR_MODULES
-        
+
         # Skip if we're in the position detection patterns
         if (row < 7 and col < 7) or \
            (row < 7 and col > QR_MODULES-8) or \
            (row > QR_MODULES-8 and col < 7):
             continue
-            
-        # Draw up to 8 modules based on the byte value
+
+        # Set up to 8 modules based on the byte value
         for bit in range(8):
             if row >= QR_MODULES or col >= QR_MODULES:
                 break
             if byte & (1 << bit):
-                pygame.draw.rect(surface, BLACK,
-                               (x + col * MODULE_SIZE,
-                                y + row * MODULE_SIZE,
-                                MODULE_SIZE,
-                                MODULE_SIZE))
+                modules[row * QR_MODULES + col] = 1
             col += 1
             if col >= QR_MODULES:
                 col = 0
                 row += 1
+    return bytes(modules)
+
+@functools.lru_cache(maxsize=8)
+def qr_surface(url, module_size=MODULE_SIZE):
+    """QR pattern for a URL rendered with square modules of module_size pixels"""
+    pixels = b''.join(bytes(BLACK if module else WHITE) for module in qr_modules(url))
+    bitmap = pygame.image.frombuffer(pixels, (QR_MODULES, QR_MODULES), 'RGB')
+    # One pixel per module, so nearest-neighbour scaling keeps the modules crisp at any size
+    return pygame.transform.scale(bitmap, (QR_MODULES * module_size, QR_MODULES * module_size))
+
+def draw_qr_pattern(surface, x, y, url):
+    """Draw a simple QR-like pattern based on URL hash"""
+    surface.blit(qr_surface(url), (x, y))
 
 class Button:
     def __init__(self, x, y, width, height, text):
         self.rect = pygame.Rect(x, y, width, height)
         self.text = text
         self.is_hovered = False
+        self.needs_redraw = True
         self.font = pygame.font.Font(None, 36)
 
     def draw(self, surface):
+        self.needs_redraw = False
         color = GRAY if self.is_hovered else BLACK
         pygame.draw.rect(surface, color, self.rect)
         text_surface = self.font.render(self.text, True, WHITE)
@@ -573,18 +662,84 @@ class Button:
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEMOTION:
-            self.is_hovered = self.rect.collidepoint(event.pos)
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if self.is_hovered:
-                return True
+            is_hovered = self.rect.collidepoint(event.pos)
+            if is_hovered != self.is_hovered:
+                self.is_hovered = is_hovered
+                self.needs_redraw = True
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == pygame.BUTTON_LEFT:
+            return self.rect.collidepoint(event.pos)
         return False
 
-class Game:
+    def clear_hover(self):
+        """Forget the hover state, e.g. after the button was hidden while the mouse moved"""
+        if self.is_hovered:
+            self.is_hovered = False
+            self.needs_redraw = True
+
+class ProfilerHUD:
+    """Frame time percentiles and the latest main loop phase timings, in the top-left corner"""
+    REFRESH = 0.25  # Seconds between updates, so the HUD itself stays cheap
+    PHASES = ("events", "Game.draw", "view.draw", "display")
+
     def __init__(self):
+        self.font = pygame.font.Font(None, 20)
+        self.rect = pygame.Rect(5, 5, 460, 36)
+        self.next_refresh = 0
+
+    @staticmethod
+    def milliseconds(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+    def draw(self, surface, force=False):
+        """Repaint the HUD when it is due (or forced); returns its rect when drawn"""
+        now = time.perf_counter()
+        if not force and now < self.next_refresh:
+            return None
+        self.next_refresh = now + self.REFRESH
+
+        p50, p95, p99 = profiler.frame_percentiles(50, 95, 99)
+        lines = [
+            f"frame p50 {self.milliseconds(p50)}  p95 {self.milliseconds(p95)}  "
+            f"p99 {self.milliseconds(p99)} ms ({len(profiler.frame_times)} frames)",
+            "  ".join(f"{phase} {self.milliseconds(profiler.last.get(phase))}" for phase in self.PHASES) + " ms",
+        ]
+        surface.fill(WHITE, self.rect)
+        for row, line in enumerate(lines):
+            surface.blit(self.font.render(line, True, BLACK), (self.rect.x, self.rect.y + row * 18))
+        return self.rect
+
+class Game:
+    def __init__(self, screen):
+        self.screen = screen
         self.state = WELCOME_SCREEN
+        self.needs_full_redraw = True  # Only used by the welcome screen; the dungeon view tracks its own
         self.setup_welcome_screen()
-        self.setup_game_screen()
+        self.dungeon_map = None
+        self.dungeon_view = None
+        # The next new dungeon is built in the background while the player
+        # is on the welcome screen or busy with the current one
+        self.next_seed = random_seed()
+        self.pregeneration = None
+        self.pregenerate()
+        self.recorder = None  # SessionRecorder of the current game while RECORD_DIR is set
         self.game_over_font = pygame.font.Font(None, 72)
+        self.profiler_hud = ProfilerHUD()
+
+        # Shown under the map once the game is over
+        self.retry_button = Button(
+            WINDOW_WIDTH // 2 - BUTTON_WIDTH - 10,
+            WINDOW_HEIGHT - BUTTON_HEIGHT,
+            BUTTON_WIDTH,
+            BUTTON_HEIGHT,
+            "Retry"
+        )
+        self.new_dungeon_button = Button(
+            WINDOW_WIDTH // 2 + 10,
+            WINDOW_HEIGHT - BUTTON_HEIGHT,
+            BUTTON_WIDTH,
+            BUTTON_HEIGHT,
+            "New Dungeon"
+        )
 
     def setup_welcome_screen(self):
         self.start_button = Button(
@@ -594,6 +749,13 @@ class Game:
             BUTTON_HEIGHT,
             "Start Game"
         )
+        self.endless_button = Button(
+            WINDOW_WIDTH // 2 - BUTTON_WIDTH // 2,
+            WINDOW_HEIGHT // 2 + BUTTON_HEIGHT + 10,
+            BUTTON_WIDTH,
+            BUTTON_HEIGHT,
+            "Endless Mode"
+        )
         self.title_font = pygame.font.Font(None, 48)
         self.title_text = self.title_font.render("Welcome to D&D Sweeper", True, BLACK)
         self.title_rect = self.title_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 3))
@@ -601,56 +763,230 @@ class Game:
         # URL setup for QR code
         self.url_font = pygame.font.Font(None, 24)
         self.url = "http://localhost:8000"  # Default URL
-        self.url_text = self.url_font.render(self.url, True, BLACK)
-        self.url_rect = self.url_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT - 50))
         
         # QR code position
         self.qr_x = WINDOW_WIDTH // 2 - QR_SIZE // 2
         self.qr_y = WINDOW_HEIGHT - 150 - QR_SIZE // 2
 
-    def setup_game_screen(self):
-        self.dungeon_map = DungeonMap()
+        # Everything but the buttons, composited once by welcome_background()
+        self.welcome_surface = None
+        self.welcome_key = None
+
+    def welcome_background(self):
+        """Static part of the welcome screen, rebuilt only when the URL or window size changes"""
+        key = (self.url, self.screen.get_size())
+        if key != self.welcome_key:
+            self.welcome_key = key
+            background = pygame.Surface(self.screen.get_size()).convert()
+            background.fill(WHITE)
+            background.blit(self.title_text, self.title_rect)
+            draw_qr_pattern(background, self.qr_x, self.qr_y, self.url)
+            url_text = self.url_font.render(self.url, True, BLACK)
+            background.blit(url_text, url_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT - 50)))
+            self.welcome_surface = background
+        return self.welcome_surface
+
+    def pregenerate(self):
+        """Start building the dungeon for next_seed without holding up the frames"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Not running under asyncio; setup_game_screen() generates on demand
+        self.pregeneration = loop.create_task(DungeonMap.cached_async(self.next_seed))
+
+    def take_next_seed(self):
+        """Seed for a new dungeon, normally already generated in the background"""
+        if self.pregeneration is not None and not self.pregeneration.done():
+            # Drop the half-built dungeon: cached() below generates the seed
+            # from scratch, which is quicker than waiting for its remaining slices
+            self.pregeneration.cancel()
+        seed = self.next_seed
+        self.next_seed = random_seed()
+        self.pregenerate()
+        return seed
+
+    def setup_game_screen(self, seed=None, endless=False):
+        """Start a dungeon; a pre-generated or recently played seed skips generation entirely"""
+        self.endless = endless
+        self.save_recording()
+        if endless:
+            self.dungeon_map = ChunkedDungeon(random_seed() if seed is None else seed)
+        else:
+            if seed is None:
+                seed = self.take_next_seed()
+            self.dungeon_map = DungeonMap.cached(seed)
+        if RECORD_DIR:
+            self.recorder = SessionRecorder(self.dungeon_map, "endless" if endless else "classic")
+        self.dungeon_view = (WorldView if endless else DungeonView)(self.dungeon_map)
+
+    def save_recording(self):
+        """Write the current game's session file, if it is being recorded"""
+        if self.recorder is None:
+            return
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        path = os.path.join(RECORD_DIR, f"session_{self.recorder.mode}_{self.dungeon_map.seed}_"
+                                        f"{time.strftime('%Y%m%d_%H%M%S')}.json")
+        self.recorder.save(path)
+        self.recorder = None
 
-    def handle_event(self, event):
+    def request_full_redraw(self):
         if self.state == WELCOME_SCREEN:
+            self.needs_full_redraw = True
+        else:
+            self.dungeon_view.needs_full_redraw = True
+
+    def handle_profiler_key(self, key):
+        if key == pygame.K_F3:
+            profiler.enabled = not profiler.enabled
+            if not profiler.enabled:
+                self.request_full_redraw()  # Erase the HUD
+        elif key == pygame.K_F4 and profiler.enabled:
+            profiler.export_chrome_trace(TRACE_FILE)
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key in (pygame.K_F3, pygame.K_F4):
+            self.handle_profiler_key(event.key)
+        elif self.state == WELCOME_SCREEN:
             if self.start_button.handle_event(event):
+                self.setup_game_screen()
+                self.state = GAME_SCREEN
+            elif self.endless_button.handle_event(event):
+                self.setup_game_screen(endless=True)
                 self.state = GAME_SCREEN
         elif self.state == GAME_SCREEN:
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                self.dungeon_map.handle_click(event.pos)
+            if self.dungeon_map.game_over:
+                if self.retry_button.handle_event(event):
+                    self.setup_game_screen(self.dungeon_map.seed, self.endless)
+                elif self.new_dungeon_button.handle_event(event):
+                    self.setup_game_screen(endless=self.endless)
+            # Wheel notches also arrive as presses of buttons 4 and 5; zooming handles them
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == pygame.BUTTON_LEFT:
+                self.dungeon_view.handle_click(event.pos)
+                if self.dungeon_map.game_over:
+                    # The buttons saw no mouse motion while the game ran
+                    self.retry_button.clear_hover()
+                    self.new_dungeon_button.clear_hover()
+            elif event.type == pygame.KEYDOWN:
+                self.dungeon_view.handle_key(event)
+            elif event.type == pygame.MOUSEWHEEL:
+                self.dungeon_view.handle_zoom(event.y, pygame.mouse.get_pos())
 
     def draw(self):
-        screen.fill(WHITE)
-        
+        """Draw the current screen.
+
+        Returns the list of rects that changed (empty when nothing did), or
+        None when the whole window was repainted and needs a full flip.
+        """
+        dirty_rects = self.draw_screen()
+        if profiler.enabled:
+            hud_rect = self.profiler_hud.draw(self.screen, force=dirty_rects is None)
+            if hud_rect is not None and dirty_rects is not None:
+                dirty_rects.append(hud_rect)
+        return dirty_rects
+
+    def draw_screen(self):
+        screen = self.screen
         if self.state == WELCOME_SCREEN:
-            screen.blit(self.title_text, self.title_rect)
-            self.start_button.draw(screen)
-            draw_qr_pattern(screen, self.qr_x, self.qr_y, self.url)
-            screen.blit(self.url_text, self.url_rect)
+            buttons = (self.start_button, self.endless_button)
+            if self.needs_full_redraw:
+                self.needs_full_redraw = False
+                screen.blit(self.welcome_background(), (0, 0))
+                for button in buttons:
+                    button.draw(screen)
+                return None
+            dirty_rects = []
+            for button in buttons:
+                if button.needs_redraw:
+                    button.draw(screen)
+                    dirty_rects.append(button.rect)
+            return dirty_rects
         elif self.state == GAME_SCREEN:
-            self.dungeon_map.draw(screen)
+            full_redraw = self.dungeon_view.needs_full_redraw
+            if full_redraw:
+                screen.fill(WHITE)
+            with profiler.span("view.draw", "draw"):
+                dirty_rects = self.dungeon_view.draw(screen)
             
             # Draw game over message if applicable
-            if self.dungeon_map.game_over:
+            repaint_overlay = self.dungeon_map.game_over and (full_redraw or dirty_rects)
+            if repaint_overlay:
                 text = self.game_over_font.render("Game Over!", True, RED)
                 text_rect = text.get_rect(center=(WINDOW_WIDTH // 2, 50))
                 screen.blit(text, text_rect)
-
-async def main():
-    game = Game()
+                dirty_rects.append(text_rect)
+            if self.dungeon_map.game_over:
+                for button in (self.retry_button, self.new_dungeon_button):
+                    if repaint_overlay or button.needs_redraw:
+                        button.draw(screen)
+                        dirty_rects.append(button.rect)
+
+            return None if full_redraw else dirty_rects
+
+def coalesce_motion(events):
+    """Drop mouse motion events that are immediately followed by another one.
+
+    Only the latest position of a run of motion matters for hovering, and
+    keeping the last one of each run preserves its order relative to clicks.
+    """
+    return [event for event, following in zip(events, events[1:] + [None])
+            if not (event.type == pygame.MOUSEMOTION and following is not None
+                    and following.type == pygame.MOUSEMOTION)]
+
+class FrameScheduler:
+    """Paces the main loop without ever blocking the asyncio event loop.
+
+    Frames are capped at fps while the game is active. After idle_after
+    seconds without input or redraws the loop only polls for input at
+    idle_fps, until the next event wakes it up again.
+    """
+    def __init__(self, fps=FPS, idle_fps=IDLE_FPS, idle_after=IDLE_AFTER):
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.frame_start = time.perf_counter()
+        self.last_active = self.frame_start
+
+    async def tick(self, active):
+        """Wait for the next frame; active tells whether this frame handled input or drew anything"""
+        now = time.perf_counter()
+        if active:
+            self.last_active = now
+        rate = self.idle_fps if now - self.last_active >= self.idle_after else self.fps
+        delay = self.frame_start + 1 / rate - now if rate else 0
+        # Always yield, even when running late, so the browser stays responsive
+        await asyncio.sleep(max(delay, 0))
+        self.frame_start = time.perf_counter()
+
+async def main(fps=FPS, idle_fps=IDLE_FPS):
+    pygame.init()
+    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    pygame.display.set_caption("D&D Sweeper")
+    pygame.key.set_repeat(200, 50)  # Hold an arrow key to keep panning
+    game = Game(screen)
+    scheduler = FrameScheduler(fps, idle_fps)
     
     running = True
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            
-            game.handle_event(event)
-
-        game.draw()
-        pygame.display.flip()
-        await asyncio.sleep(0)
-
+        with profiler.frame():
+            with profiler.span("events", "loop"):
+                events = coalesce_motion(pygame.event.get())
+                for event in events:
+                    if event.type == pygame.QUIT:
+                        running = False
+                    
+                    game.handle_event(event)
+
+            with profiler.span("Game.draw", "draw"):
+                dirty_rects = game.draw()
+            with profiler.span("display", "draw"):
+                if dirty_rects is None:
+                    pygame.display.flip()
+                elif dirty_rects:
+                    pygame.display.update(dirty_rects)
+        await scheduler.tick(bool(events) or dirty_rects != [])
+
+    game.save_recording()
     pygame.quit()
 
-asyncio.run(main()) 
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""Opt-in timing spans for the main loop and dungeon generation"""
+import contextlib
+import json
+import os
+import time
+from collections import deque
+
+FRAME = "frame"  # Name of the span covering one main loop iteration
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'category', 'start')
+
+    def __init__(self, profiler, name, category):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.category, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    """Collects timing spans while enabled"""
+    def __init__(self, enabled=False, max_spans=100000, max_frames=600):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.spans = deque(maxlen=max_spans)  # (name, category, start, end) in perf_counter seconds
+        self.frame_times = deque(maxlen=max_frames)  # Seconds per recent frame
+        self.last = {}  # Span name -> duration of its latest occurrence
+
+    def span(self, name, category="game"):
+        """Context manager timing the enclosed block"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category)
+
+    def frame(self):
+        """Context manager timing one main loop iteration"""
+        return self.span(FRAME, "loop")
+
+    def record(self, name, category, start, end):
+        self.spans.append((name, category, start, end))
+        self.last[name] = end - start
+        if name == FRAME:
+            self.frame_times.append(end - start)
+
+    def frame_percentiles(self, *percents):
+        """Nearest-rank percentiles of the recent frame times, in seconds (None without frames)"""
+        if not self.frame_times:
+            return [None] * len(percents)
+        ordered = sorted(self.frame_times)
+        return [ordered[min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))]
+                for percent in percents]
+
+    def chrome_trace(self):
+        """Recorded spans as a Chrome trace-event document"""
+        events = [{
+            'name': name,
+            'cat': category,
+            'ph': 'X',  # Complete event: start and duration in one record
+            'ts': (start - self.origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': 0,
+        } for name, category, start, end in self.spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+
+# Shared by the engine and the front end
+profiler = Profiler(enabled=bool(os.environ.get('DDSWEEPER_PROFILE')))
@@ -0,0 +1,175 @@
+"""Record play sessions and replay them headless at full speed"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+import zlib
+
+from dungeon import GRID_WIDTH, GRID_HEIGHT, CellType, DungeonMap
+from world import ChunkedDungeon
+
+SESSION_FORMAT = "dd-sweeper-session"
+SESSION_VERSION = 1
+
+
+class SessionRecorder:
+    """Collects the inputs applied to a DungeonMap or ChunkedDungeon"""
+    def __init__(self, game_map, mode="classic"):
+        self.game_map = game_map
+        self.mode = mode
+        self.start = time.perf_counter()
+        self.events = []  # [seconds since start, kind, x, y]
+        game_map.recorder = self
+
+    def record(self, kind, x, y):
+        self.events.append([round(time.perf_counter() - self.start, 4), kind, x, y])
+
+    def to_dict(self):
+        game_map = self.game_map
+        if self.mode == "endless":
+            width, height = game_map.chunk_width, game_map.chunk_height
+        else:
+            width, height = game_map.width, game_map.height
+        return {
+            'format': SESSION_FORMAT,
+            'version': SESSION_VERSION,
+            'mode': self.mode,
+            'seed': game_map.seed,
+            'width': width,
+            'height': height,
+            'events': self.events,
+            'checksum': state_checksum(game_map),
+        }
+
+    def save(self, path):
+        with open(path, 'w') as session_file:
+            json.dump(self.to_dict(), session_file, separators=(',', ':'))
+
+
+def load_session(path):
+    with open(path) as session_file:
+        session = json.load(session_file)
+    if session.get('format') != SESSION_FORMAT or session.get('version') != SESSION_VERSION:
+        raise ValueError(f"{path} is not a version {SESSION_VERSION} session file")
+    return session
+
+
+def state_checksum(game_map):
+    """SHA-256 over everything play can change: cell states, visibility and game over"""
+    digest = hashlib.sha256()
+    if isinstance(game_map, ChunkedDungeon):
+        for key in sorted(set(game_map.chunks) | set(game_map.stored)):
+            chunk = game_map.chunks.get(key)
+            if chunk is None:
+                chunk = DungeonMap.from_bytes(zlib.decompress(game_map.stored[key]))
+            digest.update(repr(key).encode())
+            digest.update(chunk.cell_states)
+            digest.update(chunk.visible)
+    else:
+        digest.update(game_map.cell_states)
+        digest.update(game_map.visible)
+    digest.update(b'\x01' if game_map.game_over else b'\x00')
+    return digest.hexdigest()
+
+
+def new_game_map(session):
+    """The dungeon a session starts from, exactly as the game builds it"""
+    if session['mode'] == "endless":
+        return ChunkedDungeon(session['seed'], session['width'], session['height'])
+    return DungeonMap(session['width'], session['height'], seed=session['seed'])
+
+
+def replay(session):
+    """Apply a session's inputs back to back; returns (final game map, stats)"""
+    start = time.perf_counter()
+    game_map = new_game_map(session)
+    generated = time.perf_counter()
+
+    click = game_map.click
+    set_focus = getattr(game_map, 'set_focus', None)
+    clicks = 0
+    for _, kind, x, y in session['events']:
+        if kind == "click":
+            click(x, y)
+            clicks += 1
+        elif kind == "focus":
+            set_focus(x, y)
+    finished = time.perf_counter()
+
+    return game_map, {
+        'events': len(session['events']),
+        'clicks': clicks,
+        'generation_seconds': generated - start,
+        'replay_seconds': finished - generated,
+        'checksum': state_checksum(game_map),
+    }
+
+
+def synthesize_session(seed, clicks, width=GRID_WIDTH, height=GRID_HEIGHT):
+    """Session of random clicks on hidden cells, for benchmarking without a player.
+
+    Monsters are avoided so that the session keeps exercising the reveal
+    logic instead of ending at the first unlucky click.
+    """
+    dungeon = DungeonMap(width, height, seed=seed)
+    recorder = SessionRecorder(dungeon)
+    rng = random.Random(seed)
+    for _ in range(clicks):
+        x, y = rng.randrange(width), rng.randrange(height)
+        if dungeon.cell(x, y).cell_type != CellType.MONSTER:
+            dungeon.click(x, y)
+    return recorder.to_dict()
+
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return value
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Replay recorded D&D Sweeper sessions headless.")
+    parser.add_argument('sessions', nargs='*', help="session files to replay")
+    parser.add_argument('--repeat', type=positive_int, default=1, help="replays per session (default %(default)s)")
+    parser.add_argument('--synthesize', type=int, metavar='CLICKS',
+                        help="write a session of random clicks instead of replaying")
+    parser.add_argument('--seed', type=int, default=0, help="dungeon seed for --synthesize")
+    parser.add_argument('--output', help="file receiving the synthesized session")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.synthesize is not None:
+        if not args.output:
+            print("--synthesize needs --output", file=sys.stderr)
+            return 2
+        session = synthesize_session(args.seed, args.synthesize)
+        with open(args.output, 'w') as session_file:
+            json.dump(session, session_file, separators=(',', ':'))
+        print(f"Wrote {len(session['events'])} clicks on seed {args.seed} to {args.output}")
+        return 0
+
+    mismatches = 0
+    for path in args.sessions:
+        session = load_session(path)
+        clicks = 0
+        replay_seconds = 0.0
+        for _ in range(args.repeat):
+            _, stats = replay(session)
+            clicks += stats['clicks']
+            replay_seconds += stats['replay_seconds']
+        matches = stats['checksum'] == session['checksum']
+        mismatches += not matches
+        rate = clicks / replay_seconds if replay_seconds else float('inf')
+        print(f"{path}: {stats['clicks']} clicks, {rate:,.0f} clicks/s, "
+              f"generation {stats['generation_seconds'] * 1000:.1f} ms, "
+              f"checksum {stats['checksum'][:16]} {'ok' if matches else 'MISMATCH'}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Deduce which hidden cells are safe from the numbers a player can see"""
+from dungeon import CellState, CellType
+
+OCCUPIED_TYPES = (CellType.MONSTER, CellType.TREASURE)
+
+
+def _bits(mask):
+    """Positions of the set bits of mask"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def propagate(constraints):
+    """Solve (mask, count) constraints as far as certain; returns (empty mask, occupied mask)"""
+    empty = occupied = 0
+    pending = set(constraints)
+    while pending:
+        reduced = set()
+        changed = False
+        # Each constraint says exactly count of the hidden cells in mask hold a monster or treasure
+        for mask, count in pending:
+            count -= (mask & occupied).bit_count()
+            mask &= ~(empty | occupied)
+            if not mask:
+                continue
+            if count == 0:
+                empty |= mask
+                changed = True
+            elif count == mask.bit_count():
+                occupied |= mask
+                changed = True
+            else:
+                reduced.add((mask, count))
+        pending = reduced
+        if changed:
+            continue
+
+        # Subset reasoning: a constraint A inside B leaves B - A with B.count - A.count.
+        # Any superset of A contains A's lowest cell
+        by_cell = {}
+        for constraint in pending:
+            for bit in _bits(constraint[0]):
+                by_cell.setdefault(bit, []).append(constraint)
+        derived = set()
+        for mask, count in pending:
+            for other_mask, other_count in by_cell[(mask & -mask).bit_length() - 1]:
+                if other_mask != mask and mask & ~other_mask == 0:
+                    difference = (other_mask & ~mask, other_count - count)
+                    if difference not in pending:
+                        derived.add(difference)
+        if not derived:
+            break
+        pending |= derived
+    return empty, occupied
+
+
+def _digit_table(*values):
+    """bytes.translate table mapping the given byte values to b'1' and every other one to b'0'"""
+    return bytes(ord('1') if value in values else ord('0') for value in range(256))
+
+
+HIDDEN_DIGITS = _digit_table(CellState.HIDDEN)
+REVEALED_DIGITS = _digit_table(CellState.REVEALED)
+OCCUPIED_DIGITS = _digit_table(*OCCUPIED_TYPES)
+FLOOR_DIGITS = _digit_table(CellType.FLOOR)
+
+
+def _flat_bits(data, table):
+    """Big int with bit i set where table maps data[i] to b'1'"""
+    return int(data.translate(table)[::-1], 2)
+
+
+def _padded_bits(data, width, height, table):
+    """Big int with bit (y + 1) * (width + 2) + x + 1 set where table maps data[y * width + x] to b'1'.
+
+    The one-cell border of zero bits lets a cell's 3x3 neighbourhood be
+    masked with a single shifted kernel, even at the edges of the grid.
+    """
+    stride = width + 2
+    digits = bytearray(b'0') * (stride * (height + 2))
+    for y in range(height):
+        start = (y + 1) * stride + 1
+        digits[start:start + width] = data[y * width:(y + 1) * width].translate(table)
+    return int(digits[::-1], 2)
+
+
+def revealed_floor(dungeon):
+    """Flat indices of revealed floor cells, the ones whose numbers give constraints"""
+    return set(_bits(_flat_bits(dungeon.cell_states, REVEALED_DIGITS) &
+                     _flat_bits(dungeon.cell_types, FLOOR_DIGITS)))
+
+
+def deduce(dungeon, known_empty=(), frontier=None):
+    """Hidden cells that are certainly empty and certainly occupied, as sets of flat indices.
+
+    known_empty lists hidden cells the player has learnt are empty some
+    other way, such as doors that did not react to a click. frontier is
+    a set of revealed floor cells to read constraints from (all of them
+    by default); cells with no hidden neighbours left are removed from it.
+    """
+    width, height = dungeon.width, dungeon.height
+    stride = width + 2
+    if frontier is None:
+        frontier = revealed_floor(dungeon)
+    hidden = _padded_bits(dungeon.cell_states, width, height, HIDDEN_DIGITS)
+    found = (_padded_bits(dungeon.cell_states, width, height, REVEALED_DIGITS) &
+             _padded_bits(dungeon.cell_types, width, height, OCCUPIED_DIGITS))
+    unknown = hidden
+    for index in known_empty:
+        unknown &= ~(1 << (index + (index // width) * 2 + stride + 1))
+
+    # The 3x3 neighbourhood of a cell, shifted by the padded position of its top-left neighbour
+    kernel = 0b111 | 0b101 << stride | 0b111 << 2 * stride
+    adjacent_counts = dungeon.adjacent_counts
+    constraints = []
+    exhausted = []
+    for index in frontier:
+        around = kernel << (index + (index // width) * 2)
+        if not hidden & around:
+            exhausted.append(index)
+            continue
+        mask = unknown & around
+        if mask:
+            constraints.append((mask, adjacent_counts[index] - (found & around).bit_count()))
+    frontier.difference_update(exhausted)
+
+    empty, occupied = propagate(constraints)
+    return ({(bit // stride - 1) * width + bit % stride - 1 for bit in _bits(empty)},
+            {(bit // stride - 1) * width + bit % stride - 1 for bit in _bits(occupied)})
+
+
+def treasure_room_cells(dungeon):
+    """Hidden cells of treasure rooms where a treasure has been found.
+
+    Rooms only hold one kind of content, so whatever else such a room
+    holds is treasure too and every cell of it is safe to click.
+    """
+    width = dungeon.width
+    cell_types, cell_states = dungeon.cell_types, dungeon.cell_states
+    cells = set()
+    for room in dungeon.rooms:
+        if room['type'] != "treasure":
+            continue
+        rows = [(y * width + room['x'], y * width + room['x'] + room['width'])
+                for y in range(room['y'], room['y'] + room['height'])]
+        if any(cell_type == CellType.TREASURE and state == CellState.REVEALED
+               for start, end in rows
+               for cell_type, state in zip(cell_types[start:end], cell_states[start:end])):
+            cells.update(start + offset for start, end in rows
+                         for offset, state in enumerate(cell_states[start:end]) if state == CellState.HIDDEN)
+    return cells
+
+
+def hint(dungeon):
+    """(x, y) of a hidden cell that is certainly safe to click, or None when every move is a guess.
+
+    Deduced cells that are really doors are skipped: clicking one reveals
+    nothing, so the hint would point at it forever. Telling them apart
+    uses the hidden cell types, which the player cannot see.
+    """
+    if dungeon.game_over:
+        return None
+    empty, _ = deduce(dungeon)
+    safe = [index for index in empty if dungeon.cell_types[index] != CellType.DOOR] or \
+        sorted(treasure_room_cells(dungeon))
+    if not safe:
+        return None
+    y, x = divmod(min(safe), dungeon.width)
+    return x, y
+
+
+def unsolved_cells(dungeon):
+    """Empty floor cells a player could only reach by guessing, as sorted flat indices.
+
+    Every room is opened the way a safe first click would: through its
+    first zero-count floor cell. From there only deduced-empty cells are
+    clicked. The input dungeon is not modified.
+    """
+    played = dungeon.copy()
+    width = played.width
+    cell_types = played.cell_types
+    room_ids = played.occupancy.room_ids
+    adjacent_counts = played.adjacent_counts
+    opened = set()
+    for index, room_id in enumerate(room_ids):
+        if (room_id != -1 and room_id not in opened and cell_types[index] == CellType.FLOOR
+                and adjacent_counts[index] == 0):
+            opened.add(room_id)
+            played.flood_fill_reveal(index % width, index // width)
+
+    known_empty = set()
+    frontier = revealed_floor(played)
+    while True:
+        played.dirty_cells.clear()
+        empty, _ = deduce(played, known_empty, frontier)
+        progress = False
+        for index in empty:
+            if cell_types[index] == CellType.FLOOR:
+                played.flood_fill_reveal(index % width, index // width)
+                progress = True
+            elif index not in known_empty:
+                known_empty.add(index)  # Clicking a door reveals nothing but shows it is empty
+                progress = True
+        if not progress:
+            break
+        # Only newly revealed cells can add constraints
+        frontier.update(index for index in played.dirty_cells if cell_types[index] == CellType.FLOOR)
+    return list(_bits(_flat_bits(played.cell_states, HIDDEN_DIGITS) & _flat_bits(cell_types, FLOOR_DIGITS)))
+
+
+def is_solvable(dungeon):
+    """Whether every empty floor cell can be revealed without a coin-flip once its room is opened"""
+    return not unsolved_cells(dungeon)
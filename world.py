@@ -0,0 +1,137 @@
+"""Endless dungeon made of lazily generated chunks"""
+import random
+import zlib
+
+from dungeon import GRID_WIDTH, GRID_HEIGHT, ROOM_TYPES, CorridorRouter, DungeonMap, random_seed
+
+
+def _derived_random(*parts):
+    """Random generator seeded from a stable string (unaffected by hash randomization)"""
+    return random.Random(":".join(str(part) for part in parts))
+
+
+class ChunkedDungeon:
+    """Unbounded dungeon generated chunk by chunk around a focus point.
+
+    Chunks within load_radius of the focus chunk are kept as live DungeonMaps.
+    Chunks further than keep_radius away are evicted: untouched ones are
+    simply dropped since they regenerate identically, and ones the player
+    changed are kept as zlib-compressed packed saves.
+    """
+    def __init__(self, seed=None, chunk_width=GRID_WIDTH, chunk_height=GRID_HEIGHT,
+                 load_radius=1, keep_radius=2):
+        if seed is None:
+            seed = random_seed()
+        self.seed = seed
+        self.chunk_width = chunk_width
+        self.chunk_height = chunk_height
+        self.load_radius = load_radius
+        self.keep_radius = keep_radius
+        self.chunks = {}  # (chunk_x, chunk_y) -> DungeonMap
+        self.stored = {}  # (chunk_x, chunk_y) -> compressed DungeonMap.to_bytes()
+        self.pristine = {}  # (chunk_x, chunk_y) -> cell states right after generation
+        self.game_over = False
+        self.focus_chunk = None
+        self.recorder = None  # Optional replay.SessionRecorder notified of clicks and focus changes
+
+        # Start the player in a treasure room of the origin chunk
+        self.load_chunk(0, 0).reveal_initial_room()
+        self.set_focus(chunk_width // 2, chunk_height // 2)
+
+    def portals(self, chunk_x, chunk_y, room_type):
+        """Cells on the chunk's edges where corridors of room_type cross into neighbours"""
+        width, height = self.chunk_width, self.chunk_height
+        # Portals are keyed by the edge itself so both chunks sharing it agree
+        left = _derived_random(self.seed, "v", chunk_x, chunk_y, room_type).randint(2, height - 3)
+        right = _derived_random(self.seed, "v", chunk_x + 1, chunk_y, room_type).randint(2, height - 3)
+        top = _derived_random(self.seed, "h", chunk_x, chunk_y, room_type).randint(2, width - 3)
+        bottom = _derived_random(self.seed, "h", chunk_x, chunk_y + 1, room_type).randint(2, width - 3)
+        return [(0, left), (width - 1, right), (top, 0), (bottom, height - 1)]
+
+    def chunk_of(self, x, y):
+        """Chunk coordinates and local cell coordinates of a world cell"""
+        chunk_x, local_x = divmod(x, self.chunk_width)
+        chunk_y, local_y = divmod(y, self.chunk_height)
+        return chunk_x, chunk_y, local_x, local_y
+
+    def load_chunk(self, chunk_x, chunk_y):
+        """Return a live chunk, restoring or generating it when needed"""
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            saved = self.stored.pop(key, None)
+            if saved is None:
+                chunk = self.generate_chunk(chunk_x, chunk_y)
+                self.pristine[key] = bytes(chunk.cell_states)
+            else:
+                chunk = DungeonMap.from_bytes(zlib.decompress(saved))
+            if self.game_over:
+                chunk.reveal_all()
+            self.chunks[key] = chunk
+        return chunk
+
+    def generate_chunk(self, chunk_x, chunk_y):
+        seed = _derived_random(self.seed, "chunk", chunk_x, chunk_y).randrange(2 ** 32)
+        chunk = DungeonMap(self.chunk_width, self.chunk_height, seed=seed, generate=False)
+        chunk.generate_dungeon()
+        # Corridors only turn walls into doors, which changes neither the
+        # adjacent counts nor the reveal regions, so they can be added last
+        router = CorridorRouter(chunk)
+        for room_type in ROOM_TYPES:
+            rooms = [room for room in chunk.rooms if room['type'] == room_type]
+            if not rooms:
+                continue
+            for portal_x, portal_y in self.portals(chunk_x, chunk_y, room_type):
+                # Run a corridor from the nearest room of this type out to the portal
+                room = min(rooms, key=lambda room: abs(room['x'] + room['width'] // 2 - portal_x) +
+                                                   abs(room['y'] + room['height'] // 2 - portal_y))
+                chunk.create_corridor(room['x'] + room['width'] // 2, room['y'] + room['height'] // 2,
+                                      portal_x, portal_y, room_type, router)
+        chunk.reveal_all_walls()
+        return chunk
+
+    def set_focus(self, x, y):
+        """Make sure the chunks around a world cell exist and evict distant ones"""
+        chunk_x, chunk_y, _, _ = self.chunk_of(x, y)
+        if (chunk_x, chunk_y) == self.focus_chunk:
+            return
+        if self.recorder is not None:
+            self.recorder.record("focus", x, y)
+        self.focus_chunk = (chunk_x, chunk_y)
+
+        for dy in range(-self.load_radius, self.load_radius + 1):
+            for dx in range(-self.load_radius, self.load_radius + 1):
+                self.load_chunk(chunk_x + dx, chunk_y + dy)
+
+        for key in list(self.chunks):
+            if max(abs(key[0] - chunk_x), abs(key[1] - chunk_y)) > self.keep_radius:
+                self.evict_chunk(key)
+
+    def evict_chunk(self, key):
+        chunk = self.chunks.pop(key)
+        if chunk.cell_states != self.pristine.pop(key, None):
+            self.stored[key] = zlib.compress(chunk.to_bytes())
+
+    def chunk_at(self, x, y):
+        """Live chunk holding a world cell and the cell's local coordinates, or None"""
+        chunk_x, chunk_y, local_x, local_y = self.chunk_of(x, y)
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        if chunk is None:
+            return None, local_x, local_y
+        return chunk, local_x, local_y
+
+    def click(self, x, y):
+        """Apply a player's click on a world cell"""
+        if self.recorder is not None:
+            self.recorder.record("click", x, y)
+        if self.game_over:
+            return
+        chunk, local_x, local_y = self.chunk_at(x, y)
+        if chunk is None:
+            return
+        chunk.click(local_x, local_y)
+        if chunk.game_over:
+            # Hitting a monster ends the game everywhere, not just in this chunk
+            self.game_over = True
+            for other in self.chunks.values():
+                other.reveal_all()